@@ -26,6 +26,8 @@ if PYDANTIC_V2:
         DATABASE_URL: str = "sqlite+aiosqlite:///./data/bot.db"
         DEFAULT_LANG: str = "en"
         GEMINI_API_KEY: str = ""  # Optional, for AI Assistant feature
+        BOT_API_URL: str = ""  # Optional, self-hosted telegram-bot-api server (e.g. http://127.0.0.1:8081)
+        MAX_CONCURRENT_UPDATES: int = 256  # Upper bound on updates processed at once
 
         @field_validator("OWNER_IDS", mode="before")
         @classmethod
@@ -54,6 +56,8 @@ else:
         DATABASE_URL: str = "sqlite+aiosqlite:///./data/bot.db"
         DEFAULT_LANG: str = "en"
         GEMINI_API_KEY: str = ""  # Optional, for AI Assistant feature
+        BOT_API_URL: str = ""  # Optional, self-hosted telegram-bot-api server (e.g. http://127.0.0.1:8081)
+        MAX_CONCURRENT_UPDATES: int = 256  # Upper bound on updates processed at once
 
         @validator("OWNER_IDS", pre=True)
         @classmethod
@@ -82,5 +86,7 @@ settings = Settings(
     OWNER_IDS=os.getenv("OWNER_IDS", ""),
     DATABASE_URL=os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./data/bot.db"),
     DEFAULT_LANG=os.getenv("DEFAULT_LANG", "en"),
-    GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", "")
+    GEMINI_API_KEY=os.getenv("GEMINI_API_KEY", ""),
+    BOT_API_URL=os.getenv("BOT_API_URL", ""),
+    MAX_CONCURRENT_UPDATES=int(os.getenv("MAX_CONCURRENT_UPDATES", "256")),
 )
@@ -0,0 +1,61 @@
+"""Single-task scheduler for delayed message deletions.
+
+Pending deletions live in one heap of ``(deadline, chat_id, message_id)``
+tuples consumed by one background task, instead of one JobQueue job each.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import time
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden
+
+log = logging.getLogger(__name__)
+
+_heap: list[tuple[float, int, int]] = []
+# (chat_id, message_id) pairs already in the heap, so repeats are dropped at enqueue time
+_pending: set[tuple[int, int]] = set()
+_wakeup = asyncio.Event()
+_task: asyncio.Task | None = None
+_bot: Bot | None = None
+
+
+async def _run() -> None:
+    while _heap:
+        deadline, chat_id, message_id = _heap[0]
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            # Sleep until the earliest deadline or until an earlier one is scheduled
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=delay)
+            except TimeoutError:
+                pass
+            continue
+        heapq.heappop(_heap)
+        _pending.discard((chat_id, message_id))
+        try:
+            await _bot.delete_message(chat_id, message_id)  # type: ignore[union-attr]
+        except (BadRequest, Forbidden) as e:
+            # Message already gone or delete rights lost: routine, no traceback
+            log.debug("Scheduled delete skipped chat=%s mid=%s: %s", chat_id, message_id, e)
+        except Exception as e:
+            log.exception("Scheduled delete failed chat=%s mid=%s: %s", chat_id, message_id, e)
+
+
+def schedule(bot: Bot, delay: float, chat_id: int, message_id: int) -> None:
+    """Delete ``message_id`` in ``chat_id`` after ``delay`` seconds (no-op if already scheduled)."""
+    global _task, _bot
+    _bot = bot
+    if (chat_id, message_id) in _pending:
+        return
+    _pending.add((chat_id, message_id))
+    entry = (time.monotonic() + delay, chat_id, message_id)
+    heapq.heappush(_heap, entry)
+    if _task is None or _task.done():
+        _task = asyncio.get_running_loop().create_task(_run())
+    elif _heap[0] is entry:
+        _wakeup.set()
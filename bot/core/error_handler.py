@@ -39,6 +39,7 @@ IGNORE_ERRORS = (
     "User is an administrator of the chat",
     "Can't restrict self",
     "Group chat was upgraded to a supergroup",
+    "Query is too old",
 )
 
 
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import json
 import logging
 from pathlib import Path
@@ -26,6 +27,7 @@ class I18N:
                 cls._messages[lang] = data
             except Exception as e:  # pragma: no cover
                 log.warning("Failed to load locale %s: %s", lang, e)
+        _lookup.cache_clear()
 
     @staticmethod
     def pick_lang(update: Update, fallback: str = "en") -> str:
@@ -53,12 +55,21 @@ class I18N:
         return cls._group_lang.get(group_id)
 
 
-def t(lang: str, key: str, **kwargs: Any) -> str:
+@functools.lru_cache(maxsize=4096)
+def _lookup(lang: str, key: str) -> tuple[str, bool]:
+    """Resolve (lang, key) once; also record whether the message needs formatting."""
     msg = I18N._messages.get(lang, {}).get(key)
     if msg is None:
         # fallback to English
         msg = I18N._messages.get("en", {}).get(key, key)
+    return msg, "{" in msg or "}" in msg
+
+
+def t(lang: str, key: str, **kwargs: Any) -> str:
+    msg, needs_format = _lookup(lang, key)
+    if not needs_format:
+        return msg
     try:
-        return msg.format(**kwargs)
+        return msg.format_map(kwargs)
     except Exception:
         return msg
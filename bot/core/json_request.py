@@ -0,0 +1,36 @@
+"""HTTPXRequest that decodes Bot API responses with orjson when it is installed."""
+
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from telegram.request import HTTPXRequest
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None  # type: ignore[assignment]
+
+# Pool sizes matching ApplicationBuilder's own defaults for each request object
+BOT_POOL_SIZE = 256
+GET_UPDATES_POOL_SIZE = 1
+
+
+class OrjsonRequest(HTTPXRequest):
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> Any:
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            # Let PTB's decoder handle bad UTF-8 and raise its usual errors
+            return HTTPXRequest.parse_json_payload(payload)
+
+
+def build_requests() -> Optional[tuple[HTTPXRequest, HTTPXRequest]]:
+    """Return (bot request, getUpdates request) using orjson, or None without it."""
+    if orjson is None:
+        return None
+    return (
+        OrjsonRequest(connection_pool_size=BOT_POOL_SIZE),
+        OrjsonRequest(connection_pool_size=GET_UPDATES_POOL_SIZE),
+    )
@@ -57,8 +57,16 @@ class ColoredFormatter(logging.Formatter):
         return result
 
 
+# Set once setup_logging() has installed the handlers
+_CONFIGURED = False
+
+
 def setup_logging(log_file: bool = True, debug: bool = False) -> None:
-    """Configure logging for the bot."""
+    """Configure logging for the bot; later calls are no-ops."""
+    global _CONFIGURED
+    if _CONFIGURED:
+        return
+    _CONFIGURED = True
     
     # Create logs directory if needed
     if log_file:
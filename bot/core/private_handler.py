@@ -144,9 +144,8 @@ async def handle_private_message(update: Update, context: ContextTypes.DEFAULT_T
         from ..infra.repos import GroupsRepo
         
         async with db.SessionLocal() as session:  # type: ignore
-            groups = await GroupsRepo(session).list_admin_groups(user_id)
-            if groups:
-                log.debug(f"Skipping welcome message for group admin {user_id} (manages {len(groups)} groups)")
+            if await GroupsRepo(session).has_admin_groups(user_id):
+                log.debug("Skipping welcome message for group admin %s", user_id)
                 return  # Group admins don't need instructions
     except Exception as e:
         log.error(f"Error checking admin status for {user_id}: {e}")
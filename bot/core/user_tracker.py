@@ -19,6 +19,17 @@ from ..infra.repos import UsersRepo
 log = logging.getLogger(__name__)
 
 
+def remember_group_username(context: ContextTypes.DEFAULT_TYPE, chat) -> None:
+    """Keep bot_data["_gu_map"] (gid -> public username) in step with what updates show."""
+    if chat is None or chat.type not in ("group", "supergroup"):
+        return
+    gu_map = context.bot_data.setdefault("_gu_map", {})
+    if chat.username:
+        gu_map[chat.id] = chat.username
+    else:
+        gu_map.pop(chat.id, None)
+
+
 async def track_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Track user interaction and update database.
     
@@ -130,6 +141,8 @@ def register_user_tracking(app: Application) -> None:
     # Add a pre-processor that runs before all handlers
     async def track_all_users(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Pre-process all updates to track users."""
+        # Every group update carries the chat, so the group username map never goes stale
+        remember_group_username(context, update.effective_chat)
         await track_user(update, context)
     
     # Register as a very early handler (group -100) that doesn't block
@@ -1,6 +1,12 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import functools
+import html
 import re
+import string
+import time
 from datetime import timedelta
 from typing import Any
 
@@ -35,6 +41,87 @@ def parse_duration(spec: str | None) -> timedelta | None:
     raise ValueError("Invalid duration unit")
 
 
+def user_mention_html(user: Any) -> str:
+    """HTML link to a user, with their first name escaped for parse_mode="HTML"."""
+    name = html.escape(user.first_name) if user and user.first_name else "Member"
+    uid = user.id if user else 0
+    return f'<a href="tg://user?id={uid}">{name}</a>'
+
+
+_FORMATTER = string.Formatter()
+
+
+@functools.lru_cache(maxsize=1024)
+def _template_parts(template: str) -> tuple[tuple[str, str | None], ...]:
+    try:
+        return tuple((literal, field) for literal, field, _, _ in _FORMATTER.parse(template))
+    except ValueError:
+        # Unbalanced braces: show the template verbatim
+        return ((template, None),)
+
+
+def render_template(template: str, **fields: Any) -> str:
+    """Fill ``{name}`` placeholders of an admin-supplied template in one pass.
+
+    The template is parsed once and cached. Unknown placeholders are left as
+    written, and substituted values are never re-scanned for braces.
+    """
+    out = []
+    for literal, field in _template_parts(template):
+        out.append(literal)
+        if field is not None:
+            value = fields.get(field)
+            out.append("{" + field + "}" if value is None else str(value))
+    return "".join(out)
+
+
+@functools.lru_cache(maxsize=4096)
+def rules_payload(chat_id: int, username: str | None) -> str:
+    """/start payload that opens a group's rules: ``rulesu_<username>`` or ``rules64_<b64(chat_id)>``."""
+    if username:
+        return "rulesu_" + username
+    return "rules64_" + base64.urlsafe_b64encode(str(chat_id).encode()).decode().rstrip("=")
+
+
+async def bot_username(context: Any) -> str:
+    """Return the bot's username, fetched via get_me once and cached in bot_data."""
+    username = context.bot_data.get("_bot_username")
+    if username is None:
+        username = context.bot_data["_bot_username"] = (await context.bot.get_me()).username or ""
+    return username
+
+
+# Seconds a get_chat result is reused, and the entry cap before expired ones are purged
+CHAT_CACHE_TTL = 300
+CHAT_CACHE_MAX = 5_000
+
+
+async def cached_get_chat(context: Any, chat: int | str) -> Any:
+    """get_chat by id or ``@username``, cached in bot_data for CHAT_CACHE_TTL.
+
+    Concurrent misses for the same key share one request; errors are raised
+    and not cached.
+    """
+    cache = context.bot_data.setdefault("_chat_cache", {})
+    hit = cache.get(chat)
+    now = time.monotonic()
+    if hit and hit[1] > now:
+        return hit[0]
+    inflight = context.bot_data.setdefault("_chat_inflight", {})
+    task = inflight.get(chat)
+    if task is None:
+        task = inflight[chat] = asyncio.ensure_future(context.bot.get_chat(chat))
+        task.add_done_callback(lambda _: inflight.pop(chat, None))
+    result = await asyncio.shield(task)
+    if len(cache) >= CHAT_CACHE_MAX:
+        for k in [k for k, (_, exp) in cache.items() if exp <= now]:
+            del cache[k]
+        if len(cache) >= CHAT_CACHE_MAX:
+            cache.clear()
+    cache[chat] = (result, now + CHAT_CACHE_TTL)
+    return result
+
+
 async def group_default_permissions(context: Any, chat_id: int) -> ChatPermissions:
     """Fetch the chat's default member permissions and use them to unrestrict users.
 
@@ -241,6 +241,22 @@ async def check_join_request_violator(update: Update, context: ContextTypes.DEFA
                 log.error(f"Failed to handle banned violator {user.id}: {e}")
 
 
+# How often expired global violator records are purged
+CLEANUP_INTERVAL = 300
+
+
+async def cleanup_expired_violators(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodic job: delete expired violator records (reads already treat them as absent)."""
+    try:
+        async with db.SessionLocal() as s:  # type: ignore
+            removed = await GlobalViolatorsRepo(s).cleanup_expired()
+            await s.commit()
+        if removed:
+            log.info("Removed %s expired global violator record(s)", removed)
+    except Exception as e:
+        log.error("Failed to clean up expired global violators: %s", e)
+
+
 def register(app: Application) -> None:
     """Register global enforcement handlers."""
     # Check on every message (high priority to run early)
@@ -275,4 +291,8 @@ def register(app: Application) -> None:
         group=-50
     )
     
+    app.job_queue.run_repeating(
+        cleanup_expired_violators, interval=CLEANUP_INTERVAL, first=CLEANUP_INTERVAL, name="global_violator_cleanup"
+    )
+    
     log.info("Global enforcement handlers registered")
\ No newline at end of file
@@ -1,31 +1,145 @@
 from __future__ import annotations
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update, ChatPermissions
-from telegram.ext import ContextTypes
+from telegram.ext import Application, ContextTypes
 import logging
+import asyncio
 import base64
+import functools
 import random
+import re
 import time
+from collections import OrderedDict
 
-from ...infra import db
+from sqlalchemy import select
+
+from ...infra import db, settings_repo
+from ...infra.models import Group
 from ...infra.settings_repo import SettingsRepo
+from ...core import delete_scheduler
 from ...core.permissions import require_admin
 from ...core.i18n import I18N, t
-from ...core.utils import group_default_permissions
+from ...core.utils import (
+    bot_username,
+    cached_get_chat,
+    group_default_permissions,
+    render_template,
+    rules_payload,
+    user_mention_html,
+)
+from ..verification.handlers import Pending, math_options, math_row, track_pending
 
 log = logging.getLogger(__name__)
 
+# Callback payloads: join:<accept|decline>:<gid>:<uid> and rules:accept:<gid>:<uid>
+_CB_RE = re.compile(r"^(?:join|rules):(accept|decline):(-?\d+):(-?\d+)$")
+
+# How long a sent-rules mark suppresses a duplicate rules DM, and how many marks are kept
+RULES_SENT_TTL = 300
+RULES_SENT_MAX = 4096
+# (gid, uid) -> monotonic expiry; insertion order is expiry order since the TTL is fixed
+_rules_sent: OrderedDict[tuple[int, int], float] = OrderedDict()
+
+# Rules DMs sent for pending join requests, so the /start accept/decline link can edit them
+JOIN_RULES_MSG_MAX = 10_000
+# (gid, uid) -> message_id of the DM, least recently stored first
+_join_rules_msg: OrderedDict[tuple[int, int], int] = OrderedDict()
+
+async def _chat_username(context: ContextTypes.DEFAULT_TYPE, gid: int) -> str | None:
+    """Return the group's public username.
+
+    Usernames in bot_data["_gu_map"] (seeded from the Group table, refreshed by
+    user_tracker on every group update) skip get_chat entirely; otherwise goes
+    through the shared cached_get_chat, falling back to the Group row when it fails.
+    """
+    known = context.bot_data.get("_gu_map", {}).get(gid)
+    if known:
+        return known
+    try:
+        return getattr(await cached_get_chat(context, gid), "username", None)
+    except Exception as e:
+        log.error("Failed to fetch chat username via get_chat gid=%s: %s", gid, e)
+    try:
+        async with db.SessionLocal() as s:  # type: ignore
+            g = await s.get(Group, gid)
+            return g.username if g else None
+    except Exception:
+        return None
+
+
+async def _start_link_prefix(context: ContextTypes.DEFAULT_TYPE) -> str:
+    """Return the bot's ``https://t.me/<bot>?start=`` prefix, built once per process."""
+    prefix = context.bot_data.get("_start_prefix")
+    if prefix is None:
+        prefix = context.bot_data["_start_prefix"] = "https://t.me/" + await bot_username(context) + "?start="
+    return prefix
+
+
+@functools.lru_cache(maxsize=4096)
+def _read_accept_kb(lang: str, deep_link: str) -> InlineKeyboardMarkup:
+    """Welcome "read & accept" keyboard; markups are immutable, so one per (lang, link) is shared."""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(t(lang, "welcome.read_accept"), url=deep_link)]])
+
+
+async def _answer_callback(query) -> None:
+    try:
+        await query.answer()
+    except Exception as e:
+        log.error("Failed to answer callback query %s: %s", query.id, e)
+
+
+async def _unmute(context: ContextTypes.DEFAULT_TYPE, gid: int, uid: int) -> None:
+    perms = await group_default_permissions(context, gid)
+    await context.bot.restrict_chat_member(gid, uid, permissions=perms)
+
+
+@functools.lru_cache(maxsize=1024)
+def return_group_kb(lang: str, url: str) -> InlineKeyboardMarkup:
+    """Single-button keyboard linking back to the group, built once per (lang, url)."""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(t(lang, "rules.return_group"), url=url)]])
+
+
+async def load_onboarding_groups(app: Application) -> None:
+    """Load onboarding state at startup.
+
+    Records which groups have onboarding settings so other groups' joins skip
+    the DB, and seeds bot_data["_gu_map"] with known group usernames.
+    """
+    async with db.SessionLocal() as s:  # type: ignore
+        gids = await SettingsRepo(s).load_onboarding_gids()
+        rows = (await s.execute(select(Group.id, Group.username))).all()
+    app.bot_data["_gu_map"] = {gid: username for gid, username in rows if username}
+    log.info("Loaded onboarding settings for %s group(s)", len(gids))
+
+
+def mark_rules_sent(gid: int, uid: int) -> None:
+    """Record that rules were DMed to uid for gid, suppressing repeats for RULES_SENT_TTL."""
+    now = time.monotonic()
+    _rules_sent.pop((gid, uid), None)
+    _rules_sent[(gid, uid)] = now + RULES_SENT_TTL
+    # Drop expired marks from the front, and the oldest ones past RULES_SENT_MAX
+    while _rules_sent:
+        oldest = next(iter(_rules_sent.values()))
+        if len(_rules_sent) <= RULES_SENT_MAX and oldest > now:
+            break
+        _rules_sent.popitem(last=False)
+
+
+def remember_join_rules_msg(gid: int, uid: int, message_id: int) -> None:
+    _join_rules_msg[(gid, uid)] = message_id
+    _join_rules_msg.move_to_end((gid, uid))
+    if len(_join_rules_msg) > JOIN_RULES_MSG_MAX:
+        _join_rules_msg.popitem(last=False)
+
+
+def pop_join_rules_msg(gid: int, uid: int) -> int | None:
+    """Message id of the rules DM for this join request, forgotten once read."""
+    return _join_rules_msg.pop((gid, uid), None)
+
 
-async def clear_rules_flag(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Clear the rules_sent flag after timeout. Job data contains the key and user_id."""
-    if context.job and context.job.data:
-        key = context.job.data.get("key")
-        user_id = context.job.data.get("user_id")
-        if key and user_id:
-            # Access user_data for the specific user
-            user_context = context.application.user_data.get(user_id, {})
-            if key in user_context:
-                user_context.pop(key, None)
+def rules_recently_sent(gid: int, uid: int) -> bool:
+    expiry = _rules_sent.get((gid, uid))
+    return expiry is not None and expiry > time.monotonic()
 
 
 async def send_captcha_for_join(req, context: ContextTypes.DEFAULT_TYPE, gid: int, captcha_cfg: dict) -> None:
@@ -38,7 +152,7 @@ async def send_captcha_for_join(req, context: ContextTypes.DEFAULT_TYPE, gid: in
     # NOTE: We do NOT restrict the user immediately because restricted users 
     # cannot interact with inline buttons in groups. We'll restrict them only
     # if they fail or timeout.
-    log.info(f"Preparing CAPTCHA for user {user.id} in group {gid} (not restricting yet to allow button interaction)")
+    log.info("Preparing CAPTCHA for user %s in group %s (not restricting yet to allow button interaction)", user.id, gid)
     
     # Prepare CAPTCHA
     answer = None
@@ -51,45 +165,23 @@ async def send_captcha_for_join(req, context: ContextTypes.DEFAULT_TYPE, gid: in
         a, b = random.randint(1, 9), random.randint(1, 9)
         answer = a + b
         text = t(lang_code, "captcha.math", a=a, b=b) + f"\n⏱ {timeout}s"
-        # Generate options including the correct answer
-        options = {answer}
-        while len(options) < 3:
-            options.add(random.randint(2, 18))
-        options = list(sorted(options))
-        row = [InlineKeyboardButton(str(opt), callback_data=f"captcha:math:{gid}:{user.id}:{opt}") for opt in options]
-        buttons.append(row)
+        buttons.append(math_row(gid, user.id, math_options(answer)))
     else:
         buttons.append([InlineKeyboardButton(t(lang_code, "captcha.im_human"), callback_data=f"captcha:ok:{gid}:{user.id}")])
     
     kb = InlineKeyboardMarkup(buttons)
     msg = await context.bot.send_message(gid, text, reply_markup=kb)
     
-    # Store pending verification data - use the same structure as verification handler
-    if "verify" not in context.bot_data:
-        context.bot_data["verify"] = {}
-    
-    # Import the Pending class from verification module
-    from ..verification.handlers import Pending
-    
+    # Store pending verification data; the verification sweeper handles the timeout
     pending_data = Pending(
         message_id=msg.message_id,
         deadline=time.time() + timeout,
         mode=mode,
         answer=answer
     )
-    
-    context.bot_data["verify"][(gid, user.id)] = pending_data
-    log.info(f"Stored CAPTCHA data for key ({gid}, {user.id}): mode={mode}, answer={answer}, message_id={msg.message_id}")
-    
-    # Schedule timeout cleanup
-    from ..verification.handlers import timeout_kick
-    context.job_queue.run_once(
-        timeout_kick, 
-        when=timeout, 
-        data={"chat_id": gid, "user_id": user.id}, 
-        name=f"verify:{gid}:{user.id}"
-    )
-    log.info(f"CAPTCHA sent to user {user.id} in group {gid}, mode: {mode}, timeout: {timeout}s")
+    track_pending(context, gid, user.id, pending_data)
+    log.info("Stored CAPTCHA data for key (%s, %s): mode=%s, answer=%s, message_id=%s", gid, user.id, mode, answer, msg.message_id)
+    log.info("CAPTCHA sent to user %s in group %s, mode: %s, timeout: %ss", user.id, gid, mode, timeout)
 
 
 async def on_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -102,35 +194,40 @@ async def on_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     gid = req.chat.id
     uid = req.from_user.id
     
-    log.info(f"Processing join request for user {uid} in group {gid} ({req.chat.title})")
+    # Groups that never configured onboarding just leave requests for admins
+    if settings_repo.onboarding_gids is not None and gid not in settings_repo.onboarding_gids:
+        log.debug("No onboarding settings for group %s, leaving join request from %s pending", gid, uid)
+        return
+    
+    log.info("Processing join request for user %s in group %s (%s)", uid, gid, req.chat.title)
     
     # If onboarding requires accept, send DM with rules and await response
     approve = False
     require_accept = False
     rules_text = None
     async with db.SessionLocal() as s:  # type: ignore
-        auto = await SettingsRepo(s).get(gid, "auto_approve_join") or {"enabled": False}
-        ob = await SettingsRepo(s).get(gid, "onboarding") or {"require_accept": False}
-        approve = bool(auto.get("enabled"))
-        require_accept = bool(ob.get("require_accept"))
-        rules_text = await SettingsRepo(s).get_text(gid, "rules")
+        cfg = await SettingsRepo(s).get_many(gid, ("auto_approve_join", "onboarding", "rules", "welcome"))
+    auto = cfg.get("auto_approve_join") or {"enabled": False}
+    ob = cfg.get("onboarding") or {"require_accept": False}
+    approve = bool(auto.get("enabled"))
+    require_accept = bool(ob.get("require_accept"))
+    rules_text = (cfg.get("rules") or {}).get("text")
+    wcfg = cfg.get("welcome") or {}
     
-    log.info(f"Join settings for {gid}: auto_approve={approve}, require_accept={require_accept}")
+    log.info("Join settings for %s: auto_approve=%s, require_accept=%s", gid, approve, require_accept)
 
-    # Check CAPTCHA settings
-    captcha_cfg = None
-    async with db.SessionLocal() as s:  # type: ignore
-        captcha_cfg = await SettingsRepo(s).get(gid, "captcha") or {"enabled": False}
-    captcha_enabled = captcha_cfg.get("enabled", False)
+    # CAPTCHA settings are only read when auto-approving (the only path that uses them)
+    captcha_cfg: dict = {"enabled": False}
+    captcha_enabled = False
     
     # Logical constraints: 
     # - If require_accept is on, auto_approve should be off (they conflict)
     # - CAPTCHA only works with auto_approve (requires user to be in group)
     if require_accept:
-        log.info(f"Require accept is enabled for {gid}, sending rules to user {uid}")
+        log.info("Require accept is enabled for %s, sending rules to user %s", gid, uid)
         # Disable auto_approve if require_accept is on
         if approve:
-            log.warning(f"Both require_accept and auto_approve are on for {gid}, disabling auto_approve")
+            log.warning("Both require_accept and auto_approve are on for %s, disabling auto_approve", gid)
             approve = False
         # Attempt DM
         lang_code = (req.from_user.language_code or "en").split("-")[0]
@@ -139,7 +236,7 @@ async def on_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                   first_name=req.from_user.first_name or "")
         text = header + "\n\n" + (rules_text or t(lang_code, "rules.default"))
         # Generate deep links for accept/decline to ensure bot conversation starts
-        bot_username = (await context.bot.get_me()).username or ""
+        start_prefix = await _start_link_prefix(context)
         # Encode the action with group and user IDs in base64 for cleaner URLs
         accept_payload = base64.urlsafe_b64encode(f"join_accept_{gid}_{uid}".encode()).decode().rstrip('=')
         decline_payload = base64.urlsafe_b64encode(f"join_decline_{gid}_{uid}".encode()).decode().rstrip('=')
@@ -149,11 +246,11 @@ async def on_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 [
                     InlineKeyboardButton(
                         t(lang_code, "join.accept"), 
-                        url=f"https://t.me/{bot_username}?start={accept_payload}"
+                        url=start_prefix + accept_payload
                     ),
                     InlineKeyboardButton(
                         t(lang_code, "join.decline"), 
-                        url=f"https://t.me/{bot_username}?start={decline_payload}"
+                        url=start_prefix + decline_payload
                     ),
                 ]
             ]
@@ -162,114 +259,96 @@ async def on_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             # Use user_chat_id to contact users who sent join request (requires bot to have can_invite_users permission)
             target_chat_id = req.user_chat_id
             msg = await context.bot.send_message(target_chat_id, text, reply_markup=kb, parse_mode="HTML")
-            log.info(f"Successfully sent rules to user {uid} for group {gid}")
+            log.info("Successfully sent rules to user %s for group %s", uid, gid)
             # Store message ID so we can edit it later when user clicks the deep link
-            context.application.user_data[uid][f"join_rules_msg_{gid}"] = msg.message_id
+            remember_join_rules_msg(gid, uid, msg.message_id)
             # Mark that we sent rules to avoid duplication when user clicks deep-link
-            recent_messages_key = f"rules_sent_{gid}_{req.from_user.id}"
-            context.user_data[recent_messages_key] = True
-            # Clear flag after some time
-            context.job_queue.run_once(
-                clear_rules_flag,
-                when=300,  # Clear after 5 minutes
-                data={"key": recent_messages_key, "user_id": req.from_user.id},
-                name=f"clear_rules_{gid}_{req.from_user.id}"
-            )
+            mark_rules_sent(gid, req.from_user.id)
         except Exception as e:
-            log.exception("Failed to DM rules for pre-approval gid=%s uid=%s: %s", gid, uid, e)
+            log.error("Failed to DM rules for pre-approval gid=%s uid=%s: %s", gid, uid, e)
             # Can't DM; leave pending until the user starts the bot
-            log.warning(f"User {uid} needs to start the bot first before joining group {gid}")
+            log.warning("User %s needs to start the bot first before joining group %s", uid, gid)
             return
         # Leave pending for explicit acceptance
-        log.info(f"Join request from {uid} left pending for explicit acceptance in group {gid}")
+        log.info("Join request from %s left pending for explicit acceptance in group %s", uid, gid)
         return
 
     if approve:
-        log.info(f"Auto-approve is enabled for {gid}, approving user {uid}")
+        log.info("Auto-approve is enabled for %s, approving user %s", gid, uid)
+        async with db.SessionLocal() as s:  # type: ignore
+            captcha_cfg = await SettingsRepo(s).get(gid, "captcha") or {"enabled": False}
+        captcha_enabled = captcha_cfg.get("enabled", False)
         # If CAPTCHA is enabled, we'll send it after approval
         # Check if we require acceptance to unmute after approval (default True unless require_accept pre-approval is used)
         require_unmute = bool((ob or {}).get("require_accept_unmute", True)) and not bool((ob or {}).get("require_accept", False))
         lang_code = (req.from_user.language_code or "en").split("-")[0]
-        # Try to DM rules (without button if CAPTCHA is enabled, since they need to solve CAPTCHA first)
-        try:
-            header = t(lang_code, "rules.dm.header",
-                      group_title=req.chat.title or "",
-                      first_name=req.from_user.first_name or "")
-            text = header + "\n\n" + (rules_text or t(lang_code, "rules.default"))
-            
-            # Only add Accept button if CAPTCHA is NOT enabled
-            # If CAPTCHA is enabled, user must solve it in the group first
-            kb_dm = None
-            if not captcha_enabled and require_unmute:
-                kb_dm = InlineKeyboardMarkup(
-                    [[InlineKeyboardButton(t(lang_code, "join.accept"), callback_data=f"rules:accept:{gid}:{req.from_user.id}")]]
-                )
-            
-            target_chat_id = req.user_chat_id
-            await context.bot.send_message(target_chat_id, text, reply_markup=kb_dm, parse_mode="HTML")
+        # DM rules (without button if CAPTCHA is enabled, since they need to solve CAPTCHA first)
+        header = t(lang_code, "rules.dm.header",
+                  group_title=req.chat.title or "",
+                  first_name=req.from_user.first_name or "")
+        text = header + "\n\n" + (rules_text or t(lang_code, "rules.default"))
+        
+        # Only add Accept button if CAPTCHA is NOT enabled
+        # If CAPTCHA is enabled, user must solve it in the group first
+        kb_dm = None
+        if not captcha_enabled and require_unmute:
+            kb_dm = InlineKeyboardMarkup(
+                [[InlineKeyboardButton(t(lang_code, "join.accept"), callback_data=f"rules:accept:{gid}:{req.from_user.id}")]]
+            )
+        
+        # The rules DM and the approval don't depend on each other; send both at once
+        dm_res, approve_res = await asyncio.gather(
+            context.bot.send_message(req.user_chat_id, text, reply_markup=kb_dm, parse_mode="HTML"),
+            context.bot.approve_chat_join_request(gid, req.from_user.id),
+            return_exceptions=True,
+        )
+        if isinstance(dm_res, Exception):
+            log.error("Failed to DM rules after auto-approve gid=%s uid=%s: %s", gid, req.from_user.id, dm_res)
+        else:
             # Mark that we sent rules to avoid duplication when user clicks deep-link
-            recent_messages_key = f"rules_sent_{gid}_{req.from_user.id}"
-            context.user_data[recent_messages_key] = True
-            # Clear flag after some time
-            context.job_queue.run_once(
-                clear_rules_flag,
-                when=300,  # Clear after 5 minutes
-                data={"key": recent_messages_key, "user_id": req.from_user.id},
-                name=f"clear_rules_{gid}_{req.from_user.id}"
+            mark_rules_sent(gid, req.from_user.id)
+        approved = not isinstance(approve_res, Exception)
+        if approved:
+            log.info("Approved join request for user %s in group %s", req.from_user.id, gid)
+        else:
+            log.error("Failed to approve join request gid=%s uid=%s: %s", gid, req.from_user.id, approve_res)
+        
+        # Once approved, the CAPTCHA and the mute are independent as well
+        follow_ups = []
+        if approved and captcha_enabled:
+            log.info("CAPTCHA enabled for %s, sending verification to user %s", gid, req.from_user.id)
+            follow_ups.append(send_captcha_for_join(req, context, gid, captcha_cfg))
+        if require_unmute:
+            follow_ups.append(
+                context.bot.restrict_chat_member(gid, req.from_user.id, permissions=ChatPermissions(can_send_messages=False))
             )
-        except Exception as e:
-            log.exception("Failed to DM rules after auto-approve gid=%s uid=%s: %s", gid, req.from_user.id, e)
-        # Approve the join
-        try:
-            await context.bot.approve_chat_join_request(gid, req.from_user.id)
-            log.info(f"Approved join request for user {req.from_user.id} in group {gid}")
-            
-            # If CAPTCHA is enabled, trigger it now
-            if captcha_enabled:
-                log.info(f"CAPTCHA enabled for {gid}, sending verification to user {req.from_user.id}")
-                await send_captcha_for_join(req, context, gid, captcha_cfg)
-        except Exception as e:
-            log.exception("Failed to approve join request gid=%s uid=%s: %s", gid, req.from_user.id, e)
-        # If require_unmute: restrict user and post welcome with deep-link
+        for res in await asyncio.gather(*follow_ups, return_exceptions=True):
+            if isinstance(res, Exception):
+                log.error("Post-approve CAPTCHA/mute failed gid=%s uid=%s: %s", gid, req.from_user.id, res)
+        # If require_unmute: post welcome with deep-link
         if require_unmute:
             try:
-                await context.bot.restrict_chat_member(gid, req.from_user.id, permissions=ChatPermissions(can_send_messages=False))
-            except Exception as e:
-                log.exception("Failed to mute after approve gid=%s uid=%s: %s", gid, req.from_user.id, e)
-            try:
-                bot_username = (await context.bot.get_me()).username or ""
                 # Prefer username-based payload when available to avoid negative ID encoding issues
-                payload = (
-                    f"rulesu_{req.chat.username}" if getattr(req.chat, "username", None) else f"rules64_{base64.urlsafe_b64encode(str(gid).encode()).decode().rstrip('=')}"
-                )
-                deep_link = f"https://t.me/{bot_username}?start={payload}"
+                deep_link = await _start_link_prefix(context) + rules_payload(gid, getattr(req.chat, "username", None))
                 lang = lang_code
                 
                 # Create HTML user mention for clickable profile link
-                user_mention = f'<a href="tg://user?id={req.from_user.id}">{req.from_user.first_name or "Member"}</a>'
+                user_mention = user_mention_html(req.from_user)
                 
                 # Get custom welcome template if set
-                welcome_template = None
-                async with db.SessionLocal() as s:  # type: ignore
-                    wcfg = await SettingsRepo(s).get(gid, "welcome") or {}
-                    welcome_template = wcfg.get("template")
+                welcome_template = wcfg.get("template")
                 
                 # Check if admin has set a custom template
                 if welcome_template:
                     # Process admin's custom template
-                    custom_text = welcome_template.replace("{first_name}", req.from_user.first_name or "Member")
-                    custom_text = custom_text.replace("{user_mention}", user_mention)
-                    
-                    # Format other placeholders
-                    try:
-                        custom_text = custom_text.format(
-                            group_title=req.chat.title or "",
-                            user_id=req.from_user.id,
-                            username=f"@{req.from_user.username}" if req.from_user.username else ""
-                        )
-                    except KeyError:
-                        # If formatting fails, just use the template with basic replacements
-                        pass
+                    custom_text = render_template(
+                        welcome_template,
+                        first_name=req.from_user.first_name or "Member",
+                        user_mention=user_mention,
+                        group_title=req.chat.title or "",
+                        user_id=req.from_user.id,
+                        username=f"@{req.from_user.username}" if req.from_user.username else "",
+                    )
                     
                     # ALWAYS add welcome header with user mention (localized)
                     header = t(lang, "welcome.header_greeting", user_mention=user_mention)
@@ -297,30 +376,17 @@ async def on_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                             f"Please click the button below to review the rules and unlock messaging."
                         )
                 
-                kb = InlineKeyboardMarkup([[InlineKeyboardButton(t(lang, "welcome.read_accept"), url=deep_link)]])
+                kb = _read_accept_kb(lang, deep_link)
                 m = await context.bot.send_message(gid, text_w, reply_markup=kb, parse_mode="HTML")
                 # Schedule auto-delete if TTL configured
-                async def _delete_job(ctx: ContextTypes.DEFAULT_TYPE):
-                    try:
-                        await ctx.bot.delete_message(gid, m.message_id)
-                    except Exception as e:
-                        log.exception("Failed to auto-delete welcome gid=%s mid=%s: %s", gid, m.message_id, e)
-
-                # Read TTL from welcome settings
-                try:
-                    async with db.SessionLocal() as s:  # type: ignore
-                        wcfg = await SettingsRepo(s).get(gid, "welcome") or {}
-                        ttl = int(wcfg.get("ttl_sec", 0) or 0)
-                except Exception as e:
-                    log.exception("Failed reading welcome ttl gid=%s: %s", gid, e)
-                    ttl = 0
+                ttl = int(wcfg.get("ttl_sec", 0) or 0)
                 if ttl and ttl > 0:
-                    context.job_queue.run_once(_delete_job, when=ttl)
+                    delete_scheduler.schedule(context.bot, ttl, gid, m.message_id)
             except Exception as e:
                 log.exception("Failed to post welcome with deep-link gid=%s: %s", gid, e)
     else:
         # Neither require_accept nor approve is set - leave the request pending
-        log.info(f"No auto-approve or require_accept for group {gid}, leaving join request from {uid} pending")
+        log.info("No auto-approve or require_accept for group %s, leaving join request from %s pending", gid, uid)
         # The admin will need to manually approve/decline this request
 
 
@@ -342,184 +408,105 @@ async def toggle_auto_approve(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def on_join_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.callback_query:
         return
-    await update.callback_query.answer()
-    data = (update.callback_query.data or "").split(":")
-    if len(data) != 4:
-        return
-    action, gid_s, uid_s = data[1], data[2], data[3]
-    gid = int(gid_s)
-    uid = int(uid_s)
-    if not update.effective_user or update.effective_user.id != uid:
-        return
-    
-    # Track this interaction in database to mark user as having interacted with bot
-    from ...infra import db
-    from ...infra.repos import UsersRepo
-    from datetime import datetime
-    
+    # Acknowledge the click in the background; awaited once the work is done
+    ack = asyncio.create_task(_answer_callback(update.callback_query))
     try:
-        async with db.SessionLocal() as s:  # type: ignore
-            await UsersRepo(s).upsert_user(
-                uid=uid,
-                username=getattr(update.effective_user, 'username', None),
-                first_name=getattr(update.effective_user, 'first_name', None),
-                last_name=getattr(update.effective_user, 'last_name', None),
-                language=getattr(update.effective_user, 'language_code', None),
+        m = _CB_RE.match(update.callback_query.data or "")
+        if not m:
+            return
+        action, gid, uid = m.group(1), int(m.group(2)), int(m.group(3))
+        if not update.effective_user or update.effective_user.id != uid:
+            return
+    
+        if action == "accept":
+            # Approve while looking up the group link for the Return button
+            approve_res, username = await asyncio.gather(
+                context.bot.approve_chat_join_request(gid, uid),
+                _chat_username(context, gid),
+                return_exceptions=True,
             )
-            await s.commit()
-        log.info(f"Tracked user interaction via join callback: user {uid} for group {gid}")
-    except Exception as e:
-        log.error(f"Failed to track user interaction: {e}")
-    if action == "accept":
-        try:
-            await context.bot.approve_chat_join_request(gid, uid)
-        except Exception as e:
-            log.exception("Failed to approve from pre-approval accept gid=%s uid=%s: %s", gid, uid, e)
-        # Edit only the buttons on the original DM to a Return button, keep rules text
-        lang = I18N.pick_lang(update)
-        return_kb = None
-        try:
-            chat = await context.bot.get_chat(gid)
-            if getattr(chat, "username", None):
-                url = f"https://t.me/{chat.username}"
-                from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-
-                return_kb = InlineKeyboardMarkup(
-                    [[InlineKeyboardButton(t(lang, "rules.return_group"), url=url)]]
-                )
-        except Exception as e:
-            log.exception("Failed building return button via get_chat gid=%s: %s", gid, e)
-            return_kb = None
-        if return_kb is None:
-            # Fallback to DB username
+            if isinstance(approve_res, Exception):
+                log.error("Failed to approve from pre-approval accept gid=%s uid=%s: %s", gid, uid, approve_res)
+            if isinstance(username, Exception):
+                username = None
+            # Edit only the buttons on the original DM to a Return button, keep rules text
+            lang = I18N.pick_lang(update)
+            return_kb = return_group_kb(lang, "https://t.me/" + username) if username else None
             try:
-                from ...infra.models import Group
-                async with db.SessionLocal() as s:  # type: ignore
-                    g = await s.get(Group, gid)
-                    if g and g.username:
-                        url = f"https://t.me/{g.username}"
-                        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-                        return_kb = InlineKeyboardMarkup(
-                            [[InlineKeyboardButton(t(lang, "rules.return_group"), url=url)]]
-                        )
-            except Exception:
-                return_kb = None
-        try:
-            # Edit the message to show acceptance and add return button
-            text = update.effective_message.text or ""
-            text += f"\n\n✅ {t(lang, 'rules.accepted')}"
-            await update.effective_message.edit_text(text, reply_markup=return_kb)
-        except Exception as e:
-            log.exception("Failed to edit message after accept gid=%s uid=%s: %s", gid, uid, e)
-        # Note: We don't send a separate confirmation since the message was already edited above
-    elif action == "decline":
-        lang = I18N.pick_lang(update)
-        try:
-            await context.bot.decline_chat_join_request(gid, uid)
-        except Exception as e:
-            log.exception("Failed to decline join gid=%s uid=%s: %s", gid, uid, e)
-        # Edit the message to show decline
-        try:
-            text = update.effective_message.text or ""
-            text += f"\n\n❌ {t(lang, 'join.declined')}"
-            await update.effective_message.edit_text(text, reply_markup=None)
-        except Exception as e:
-            log.exception("Failed to edit message after decline gid=%s uid=%s: %s", gid, uid, e)
-        # Note: We don't send a separate decline message since the message was already edited above
+                # Edit the message to show acceptance and add return button
+                text = update.effective_message.text or ""
+                text += f"\n\n✅ {t(lang, 'rules.accepted')}"
+                await update.effective_message.edit_text(text, reply_markup=return_kb)
+            except Exception as e:
+                log.error("Failed to edit message after accept gid=%s uid=%s: %s", gid, uid, e)
+            # Note: We don't send a separate confirmation since the message was already edited above
+        elif action == "decline":
+            lang = I18N.pick_lang(update)
+            try:
+                await context.bot.decline_chat_join_request(gid, uid)
+            except Exception as e:
+                log.error("Failed to decline join gid=%s uid=%s: %s", gid, uid, e)
+            # Edit the message to show decline
+            try:
+                text = update.effective_message.text or ""
+                text += f"\n\n❌ {t(lang, 'join.declined')}"
+                await update.effective_message.edit_text(text, reply_markup=None)
+            except Exception as e:
+                log.error("Failed to edit message after decline gid=%s uid=%s: %s", gid, uid, e)
+            # Note: We don't send a separate decline message since the message was already edited above
+    finally:
+        await ack
 
 
 async def on_rules_accept(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.callback_query:
         return
-    await update.callback_query.answer()
-    data = (update.callback_query.data or "").split(":")
-    if len(data) != 4:
-        return
-    _, _, gid_s, uid_s = data
-    gid = int(gid_s)
-    uid = int(uid_s)
-    if not update.effective_user or update.effective_user.id != uid:
-        return
-    
-    # Track this interaction in database to mark user as having interacted with bot
-    from ...infra import db
-    from ...infra.repos import UsersRepo
-    
-    try:
-        async with db.SessionLocal() as s:  # type: ignore
-            await UsersRepo(s).upsert_user(
-                uid=uid,
-                username=getattr(update.effective_user, 'username', None),
-                first_name=getattr(update.effective_user, 'first_name', None),
-                last_name=getattr(update.effective_user, 'last_name', None),
-                language=getattr(update.effective_user, 'language_code', None),
-            )
-            await s.commit()
-        log.info(f"Tracked user interaction via rules accept callback: user {uid} for group {gid}")
-    except Exception as e:
-        log.error(f"Failed to track user interaction: {e}")
-    # Unmute first (restore group default permissions)
-    try:
-        perms = await group_default_permissions(context, gid)
-        await context.bot.restrict_chat_member(gid, uid, permissions=perms)
-    except Exception as e:
-        log.exception("Failed to unmute on rules accept gid=%s uid=%s: %s", gid, uid, e)
-    # Replace only the buttons on the original rules message; keep rules visible
-    lang = I18N.pick_lang(update)
-    return_kb = None
+    # Acknowledge the click in the background; awaited once the work is done
+    ack = asyncio.create_task(_answer_callback(update.callback_query))
     try:
-        chat = await context.bot.get_chat(gid)
-        if getattr(chat, "username", None):
-            url = f"https://t.me/{chat.username}"
-            from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-
-            return_kb = InlineKeyboardMarkup([[InlineKeyboardButton(t(lang, "rules.return_group"), url=url)]])
-    except Exception as e:
-        log.exception("Failed building return button via get_chat (rules accept) gid=%s: %s", gid, e)
-        return_kb = None
-    if return_kb is None:
-        # Fallback to DB username
-        try:
-            from ...infra.models import Group
-            async with db.SessionLocal() as s:  # type: ignore
-                g = await s.get(Group, gid)
-                if g and g.username:
-                    url = f"https://t.me/{g.username}"
-                    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-                    return_kb = InlineKeyboardMarkup(
-                        [[InlineKeyboardButton(t(lang, "rules.return_group"), url=url)]]
-                    )
-        except Exception:
-            return_kb = None
-    # Update only reply markup on the original rules message
-    try:
-        await update.effective_message.edit_reply_markup(return_kb)
-    except Exception as e:
-        log.exception("Failed to edit reply markup (rules accept) gid=%s uid=%s: %s", gid, uid, e)
-    # Check if there's a reminder message to edit, otherwise send new thank-you
-    reminder_msg_key = f"reminder_msg_{gid}_{uid}"
-    reminder_msg_id = context.user_data.get(reminder_msg_key)
+        m = _CB_RE.match(update.callback_query.data or "")
+        if not m:
+            return
+        gid, uid = int(m.group(2)), int(m.group(3))
+        if not update.effective_user or update.effective_user.id != uid:
+            return
     
-    if reminder_msg_id:
-        # Edit the reminder message instead of sending a new one
-        try:
-            await context.bot.edit_message_text(
-                chat_id=update.effective_chat.id,
-                message_id=reminder_msg_id,
-                text=t(lang, "rules.accepted")
-            )
-            # Clean up the stored message ID
-            context.user_data.pop(reminder_msg_key, None)
-        except Exception as e:
-            log.exception("Failed to edit reminder message, sending new one: %s", e)
-            # Fall back to sending new message if edit fails
+        # Unmute (restore group default permissions) while looking up the group link
+        unmute_res, username = await asyncio.gather(
+            _unmute(context, gid, uid), _chat_username(context, gid), return_exceptions=True
+        )
+        if isinstance(unmute_res, Exception):
+            log.error("Failed to unmute on rules accept gid=%s uid=%s: %s", gid, uid, unmute_res)
+        if isinstance(username, Exception):
+            username = None
+        # Replace only the buttons on the original rules message; keep rules visible
+        lang = I18N.pick_lang(update)
+        return_kb = return_group_kb(lang, "https://t.me/" + username) if username else None
+        # Check if there's a reminder message to edit
+        reminder_msg_key = f"reminder_msg_{gid}_{uid}"
+        reminder_msg_id = context.user_data.pop(reminder_msg_key, None)
+    
+        if reminder_msg_id:
+            # The reminder becomes the thank-you; only swap the buttons on the rules message
             try:
-                await update.effective_message.reply_text(t(lang, "rules.accepted"))
-            except Exception as e2:
-                log.exception("Failed to send thank-you (rules accept) gid=%s uid=%s: %s", gid, uid, e2)
-    else:
-        # No reminder message, send new thank-you message
-        try:
-            await update.effective_message.reply_text(t(lang, "rules.accepted"))
-        except Exception as e:
-            log.exception("Failed to send thank-you (rules accept) gid=%s uid=%s: %s", gid, uid, e)
+                await update.effective_message.edit_reply_markup(return_kb)
+            except Exception as e:
+                log.error("Failed to edit reply markup (rules accept) gid=%s uid=%s: %s", gid, uid, e)
+            try:
+                await context.bot.edit_message_text(
+                    chat_id=update.effective_chat.id,
+                    message_id=reminder_msg_id,
+                    text=t(lang, "rules.accepted")
+                )
+            except Exception as e:
+                log.error("Failed to edit reminder message (rules accept) gid=%s uid=%s: %s", gid, uid, e)
+        else:
+            # Append the thank-you and swap the buttons in a single edit of the rules message
+            try:
+                text = update.effective_message.text_html or ""
+                text += f"\n\n✅ {t(lang, 'rules.accepted')}"
+                await update.effective_message.edit_text(text, reply_markup=return_kb, parse_mode="HTML")
+            except Exception as e:
+                log.error("Failed to edit rules message (rules accept) gid=%s uid=%s: %s", gid, uid, e)
+    finally:
+        await ack
@@ -1,22 +1,26 @@
 from __future__ import annotations
 
-from telegram import Update
+from telegram import MessageEntity, Update
 from telegram.ext import ContextTypes
 
 from ...core.i18n import I18N, t
 from ...core.permissions import require_admin
-from ...infra import db
+from ...infra import db, settings_repo
 from ...infra.settings_repo import SettingsRepo
 
 
+async def get_rules_text(gid: int) -> str | None:
+    """Return the group's custom rules text, served from the settings cache."""
+    cfg = (await settings_repo.get_cached(gid, ("rules",))).get("rules")
+    return None if cfg is None else cfg.get("text")
+
+
 async def rules(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     lang = I18N.pick_lang(update)
     gid = update.effective_chat.id if update.effective_chat else 0
     
     # Get custom rules text
-    text = None
-    async with db.SessionLocal() as s:  # type: ignore
-        text = await SettingsRepo(s).get_text(gid, "rules")
+    text = await get_rules_text(gid)
     
     # Create professional rules display
     group_name = update.effective_chat.title if update.effective_chat else "this group"
@@ -65,18 +69,15 @@ async def set_rules(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     elif context.args:
         # If text is provided after command, check if message has entities
         if msg.text and msg.entities:
-            # Extract HTML from the message, skipping the command entity
-            # Find where the command ends
-            command_end = len("/setrules")
-            if msg.text[command_end:command_end+1] == " ":
-                command_end += 1
-            # Get the text after the command with HTML formatting
+            # Extract HTML from the message, skipping the leading command entity.
+            # text_html emits bot commands untagged and they are plain ASCII, so the
+            # entity length is also the command's length in the HTML string.
             full_html = msg.text_html
-            # Remove the command part from HTML
-            # The command will be wrapped in the HTML, so we need to find and remove it
-            import re
-            # Remove the bot command entity (usually wrapped in a tag)
-            html_text = re.sub(r'^.*?/setrules\s*', '', full_html, count=1)
+            cmd = msg.entities[0]
+            if cmd.type == MessageEntity.BOT_COMMAND and cmd.offset == 0:
+                html_text = full_html[cmd.length:].lstrip()
+            else:
+                html_text = full_html
         else:
             # Plain text without formatting
             html_text = " ".join(context.args)
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
-from telegram.ext import Application, ChatMemberHandler, CallbackQueryHandler
+from telegram.ext import Application, CallbackQueryHandler
 
-from .handlers import on_chat_member, on_captcha_callback
+from .handlers import SWEEP_INTERVAL, on_captcha_callback, sweep_verify
 
 
 def register(app: Application) -> None:
-    app.add_handler(ChatMemberHandler(on_chat_member))
+    # Joins are challenged from the welcome feature's chat_member handler (handle_join)
     app.add_handler(CallbackQueryHandler(on_captcha_callback, pattern=r"^captcha:"))
 
+    # One sweeper for all CAPTCHA timeouts instead of a job per joining user
+    app.job_queue.run_repeating(sweep_verify, interval=SWEEP_INTERVAL, first=SWEEP_INTERVAL, name="verify_sweeper")
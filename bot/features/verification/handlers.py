@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import asyncio
+import heapq
 import random
+import re
 import time
 from dataclasses import dataclass
 
@@ -10,40 +13,170 @@ import logging
 
 from ...core.i18n import I18N, t
 from ...core.utils import group_default_permissions
-from ...infra import db
-from ...infra.settings_repo import SettingsRepo
 log = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Pending:
     message_id: int
     deadline: float
     mode: str
     answer: int | None
+    # Leave the user muted on success; the onboarding rules-accept flow lifts the mute instead
+    keep_muted: bool = False
 
 
-def _store(context: ContextTypes.DEFAULT_TYPE):
-    bd = context.bot_data
-    if "verify" not in bd:
-        bd["verify"] = {}
-    return bd["verify"]
+_EMPTY: dict[int, Pending] = {}
 
 
-async def on_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not update.chat_member or not update.effective_chat:
+def _store(context: ContextTypes.DEFAULT_TYPE) -> dict[int, dict[int, Pending]]:
+    """Pending CAPTCHAs keyed chat_id -> user_id -> Pending."""
+    return context.bot_data.setdefault("verify", {})
+
+
+def _pop_pending(store: dict[int, dict[int, Pending]], chat_id: int, user_id: int) -> None:
+    chat_pending = store.get(chat_id)
+    if chat_pending is None:
         return
+    chat_pending.pop(user_id, None)
+    if not chat_pending:
+        del store[chat_id]
+
+
+# How often the sweeper checks for expired CAPTCHAs
+SWEEP_INTERVAL = 5
+
+# Callback payloads: captcha:ok:<gid>:<uid> and captcha:math:<gid>:<uid>:<answer>
+_CB_RE = re.compile(r"^captcha:(ok|math):(-?\d+):(-?\d+)(?::(\d+))?$")
+
+# Labels for every possible math option (sums of two digits 1..9), built once
+_MATH_LABELS = tuple(str(i) for i in range(19))
+# Wrong options to draw from for each possible answer 2..18
+_DISTRACTORS = {a: tuple(x for x in range(2, 19) if x != a) for a in range(2, 19)}
+
+# Button CAPTCHAs for joins to one chat within this window share a single message
+BATCH_WINDOW = 0.5
+# Most users listed in one shared prompt; larger batches are split across messages
+BATCH_MAX_ROWS = 20
+
+
+def track_pending(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, pending: Pending) -> None:
+    """Register a pending CAPTCHA; sweep_verify kicks the user once its deadline passes."""
+    _store(context).setdefault(chat_id, {})[user_id] = pending
+    heapq.heappush(context.bot_data.setdefault("verify_heap", []), (pending.deadline, chat_id, user_id))
+
+
+def math_options(answer: int) -> tuple[int, ...]:
+    """The answer plus two distinct wrong options, in ascending order."""
+    return tuple(sorted((answer, *random.sample(_DISTRACTORS[answer], 2))))
+
+
+def math_row(chat_id: int, user_id: int, options) -> list[InlineKeyboardButton]:
+    """Keyboard row for a math CAPTCHA; labels come from _MATH_LABELS, only callback data is per-user."""
+    prefix = f"captcha:math:{chat_id}:{user_id}:"
+    return [InlineKeyboardButton(_MATH_LABELS[opt], callback_data=prefix + _MATH_LABELS[opt]) for opt in options]
+
+
+def _clear_prompt(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, message_id: int):
+    """Coroutine removing user_id's part of a CAPTCHA prompt.
+
+    A shared button prompt loses only that user's row while other rows remain;
+    otherwise the message is deleted. Returns (coroutine, whether it only trims).
+    """
+    shared = context.bot_data.get("captcha_rows", {})
+    rows = shared.get((chat_id, message_id))
+    if rows is not None:
+        rows.pop(user_id, None)
+        if rows:
+            markup = InlineKeyboardMarkup(list(rows.values()))
+            return context.bot.edit_message_reply_markup(chat_id, message_id, reply_markup=markup), True
+        del shared[(chat_id, message_id)]
+    return context.bot.delete_message(chat_id, message_id), False
+
+
+def _queue_button_captcha(
+    context: ContextTypes.DEFAULT_TYPE, chat_id: int, user, lang: str, timeout: int, keep_muted: bool
+) -> None:
+    """Add user to the chat's pending button-CAPTCHA batch, flushing it after BATCH_WINDOW.
+
+    Batches are keyed by (chat, lang, timeout) so every user gets the prompt text
+    and deadline their join was configured with.
+    """
+    batches = context.bot_data.setdefault("captcha_batch", {})
+    key = (chat_id, lang, timeout)
+    batch = batches.get(key)
+    if batch is not None:
+        batch.append((user, keep_muted))
+        return
+    batches[key] = [(user, keep_muted)]
+    context.application.create_task(_flush_button_captcha(context, key))
+
+
+async def _send_button_prompt(
+    context: ContextTypes.DEFAULT_TYPE, chat_id: int, lang: str, timeout: int, entries: list
+) -> None:
+    """Post one button prompt for entries (at most BATCH_MAX_ROWS) and track each user."""
+    text = t(lang, "captcha.prompt") + f"\n⏱ {timeout}s"
+    label = t(lang, "captcha.im_human")
+    if len(entries) == 1:
+        user = entries[0][0]
+        rows = {user.id: [InlineKeyboardButton(label, callback_data=f"captcha:ok:{chat_id}:{user.id}")]}
+    else:
+        # One row per joiner; the callback data still names the user it belongs to
+        rows = {
+            u.id: [InlineKeyboardButton(f"{label} · {u.first_name or u.id}", callback_data=f"captcha:ok:{chat_id}:{u.id}")]
+            for u, _ in entries
+        }
+    msg = await context.bot.send_message(chat_id, text, reply_markup=InlineKeyboardMarkup(list(rows.values())))
+    if len(rows) > 1:
+        context.bot_data.setdefault("captcha_rows", {})[(chat_id, msg.message_id)] = rows
+    deadline = time.time() + timeout
+    for u, keep_muted in entries:
+        track_pending(
+            context, chat_id, u.id,
+            Pending(message_id=msg.message_id, deadline=deadline, mode="button", answer=None, keep_muted=keep_muted),
+        )
+
+
+async def _flush_button_captcha(context: ContextTypes.DEFAULT_TYPE, key: tuple[int, str, int]) -> None:
+    await asyncio.sleep(BATCH_WINDOW)
+    chat_id, lang, timeout = key
+    entries = context.bot_data["captcha_batch"].pop(key)
+    for i in range(0, len(entries), BATCH_MAX_ROWS):
+        chunk = entries[i:i + BATCH_MAX_ROWS]
+        try:
+            await _send_button_prompt(context, chat_id, lang, timeout, chunk)
+            continue
+        except Exception as e:
+            if len(chunk) == 1:
+                log.exception("verify: send captcha failed gid=%s uid=%s: %s", chat_id, chunk[0][0].id, e)
+                continue
+            log.warning("verify: send batched captcha failed gid=%s users=%s, prompting each: %s", chat_id, len(chunk), e)
+        # Fall back to one prompt per user so nobody in the failed batch goes unchallenged
+        for entry in chunk:
+            try:
+                await _send_button_prompt(context, chat_id, lang, timeout, [entry])
+            except Exception as e:
+                log.exception("verify: send captcha failed gid=%s uid=%s: %s", chat_id, entry[0].id, e)
+
+
+async def handle_join(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, cfg: dict | None, keep_muted: bool = False
+) -> None:
+    """Challenge a user who just joined, given the chat's "captcha" setting.
+
+    Called from the welcome feature's chat_member handler, which has already
+    filtered the update down to real (non-bot) joins and loaded the settings.
+    With keep_muted, passing the CAPTCHA does not lift the user's restriction:
+    the welcome feature has muted them until they accept the rules.
+    """
     cm = update.chat_member
     chat = update.effective_chat
     user = cm.new_chat_member.user
     # Only when user just became a member
-    if cm.old_chat_member and cm.old_chat_member.status == cm.new_chat_member.status:
-        return
     if cm.new_chat_member.status.value != "member":
         return
-    # Load settings
-    async with db.SessionLocal() as s:  # type: ignore
-        cfg = await SettingsRepo(s).get(chat.id, "captcha") or {"enabled": False, "mode": "button", "timeout": 120}
+    cfg = cfg or {"enabled": False, "mode": "button", "timeout": 120}
     if not cfg.get("enabled"):
         return
     lang = I18N.pick_lang(update)
@@ -52,27 +185,22 @@ async def on_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     # NOTE: We do NOT restrict immediately because restricted users cannot click inline buttons
     # We'll only kick them if they timeout without answering
-    log.info(f"CAPTCHA enabled for user {user.id} in chat {chat.id}, mode: {mode}, timeout: {timeout}s")
-    # Prepare captcha
-    answer = None
-    text = t(lang, "captcha.prompt") + f"\n⏱ {timeout}s"
-    buttons = []
-    if mode == "math":
-        a, b = random.randint(1, 9), random.randint(1, 9)
-        answer = a + b
-        text = t(lang, "captcha.math", a=a, b=b) + f"\n⏱ {timeout}s"
-        options = set([answer, random.randint(1, 18), random.randint(1, 18)])
-        options = list(sorted(options))
-        row = [InlineKeyboardButton(str(opt), callback_data=f"captcha:math:{chat.id}:{user.id}:{opt}") for opt in options]
-        buttons.append(row)
-    else:
-        buttons.append([InlineKeyboardButton(t(lang, "captcha.im_human"), callback_data=f"captcha:ok:{chat.id}:{user.id}")])
-    kb = InlineKeyboardMarkup(buttons)
+    log.info("CAPTCHA enabled for user %s in chat %s, mode: %s, timeout: %ss", user.id, chat.id, mode, timeout)
+    if mode != "math":
+        # Joins arriving together get one shared prompt instead of one message each
+        _queue_button_captcha(context, chat.id, user, lang, timeout, keep_muted)
+        return
+    # Math questions differ per user, so each gets its own prompt
+    a, b = random.randint(1, 9), random.randint(1, 9)
+    answer = a + b
+    text = t(lang, "captcha.math", a=a, b=b) + f"\n⏱ {timeout}s"
+    kb = InlineKeyboardMarkup([math_row(chat.id, user.id, math_options(answer))])
     msg = await context.bot.send_message(chat.id, text, reply_markup=kb)
     # Track pending
-    _store(context)[(chat.id, user.id)] = Pending(message_id=msg.message_id, deadline=time.time() + timeout, mode=mode, answer=answer)
-    # Schedule timeout cleanup
-    context.job_queue.run_once(timeout_kick, when=timeout, data={"chat_id": chat.id, "user_id": user.id}, name=f"verify:{chat.id}:{user.id}")
+    track_pending(
+        context, chat.id, user.id,
+        Pending(message_id=msg.message_id, deadline=time.time() + timeout, mode=mode, answer=answer, keep_muted=keep_muted),
+    )
 
 
 async def on_captcha_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -82,24 +210,22 @@ async def on_captcha_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
             return
         
         callback_data = update.callback_query.data or ""
-        log.info(f"CAPTCHA callback received: {callback_data}")
+        log.debug("CAPTCHA callback received: %s", callback_data)
         
-        data = callback_data.split(":")
-        if len(data) < 4:
-            log.warning(f"CAPTCHA callback: Invalid data format: {callback_data}")
+        m = _CB_RE.match(callback_data)
+        if not m:
+            log.warning("CAPTCHA callback: Invalid data format: %s", callback_data)
             await update.callback_query.answer()
             return
         
-        typ = data[1]
-        chat_id = int(data[2])
-        user_id = int(data[3])
+        typ, chat_id, user_id, user_answer = m.group(1), int(m.group(2)), int(m.group(3)), m.group(4)
         
-        log.info(f"CAPTCHA callback: type={typ}, chat_id={chat_id}, user_id={user_id}, effective_user={update.effective_user.id if update.effective_user else 'None'}")
+        log.debug("CAPTCHA callback: type=%s, chat_id=%s, user_id=%s, effective_user=%s", typ, chat_id, user_id, update.effective_user.id if update.effective_user else None)
         
         # Check if this is the correct user
         if update.effective_user and update.effective_user.id != user_id:
             lang = I18N.pick_lang(update)
-            log.info(f"CAPTCHA: Wrong user {update.effective_user.id} tried to answer for user {user_id}")
+            log.info("CAPTCHA: Wrong user %s tried to answer for user %s", update.effective_user.id, user_id)
             await update.callback_query.answer(
                 t(lang, "captcha.wrong_user") or "❌ You are not the one required to solve this.",
                 show_alert=True
@@ -110,15 +236,16 @@ async def on_captcha_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         # Check pending verification
         store = _store(context)
-        log.info(f"CAPTCHA store keys: {list(store.keys())}")
-        pending = store.get((chat_id, user_id))
+        chat_pending = store.get(chat_id, _EMPTY)
+        pending = chat_pending.get(user_id)
         
         if not pending:
-            log.warning(f"No pending CAPTCHA for user {user_id} in chat {chat_id}")
-            log.warning(f"Available pending CAPTCHAs: {[(k, v.mode) for k, v in store.items()]}")
+            log.warning("No pending CAPTCHA for user %s in chat %s", user_id, chat_id)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Available pending CAPTCHAs in chat %s: %r", chat_id, [(k, v.mode) for k, v in chat_pending.items()])
             return
     except Exception as e:
-        log.exception(f"Error in CAPTCHA callback: {e}")
+        log.exception("Error in CAPTCHA callback: %s", e)
         if update.callback_query:
             try:
                 await update.callback_query.answer("Error processing CAPTCHA. Please try again.", show_alert=True)
@@ -127,41 +254,37 @@ async def on_captcha_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         raise
     
     # Log pending data details
-    log.info(f"Found pending CAPTCHA: mode={pending.mode}, answer={pending.answer}, deadline={pending.deadline}")
+    log.debug("Found pending CAPTCHA: mode=%s, answer=%s, deadline=%s", pending.mode, pending.answer, pending.deadline)
     
     # Check if answer is correct
     is_correct = False
     if typ == "ok":
         is_correct = True
-        log.info(f"User {user_id} clicked 'I am human' button for chat {chat_id}")
-    elif typ == "math" and len(data) == 5:
-        try:
-            user_answer = int(data[4])
-            is_correct = (pending.answer == user_answer)
-            log.info(f"User {user_id} answered {user_answer} (correct: {pending.answer}, is_correct: {is_correct}) for chat {chat_id}")
-        except ValueError as e:
-            log.error(f"Failed to parse math answer: {data[4]}, error: {e}")
-            is_correct = False
+        log.debug("User %s clicked 'I am human' button for chat %s", user_id, chat_id)
+    elif typ == "math" and user_answer is not None:
+        is_correct = (pending.answer == int(user_answer))
+        log.debug("User %s answered %s (correct: %s, is_correct: %s) for chat %s", user_id, user_answer, pending.answer, is_correct, chat_id)
     
     if is_correct:
-        # Verified — restore group default permissions
-        log.info(f"CAPTCHA verified for user {user_id} in chat {chat_id}")
-        try:
-            perms = await group_default_permissions(context, chat_id)
-            await context.bot.restrict_chat_member(chat_id, user_id, permissions=perms)
-        except Exception as e:
-            log.exception("verify: unrestrict failed gid=%s uid=%s: %s", chat_id, user_id, e)
-        try:
-            await context.bot.delete_message(chat_id, pending.message_id)
-        except Exception as e:
-            log.exception("verify: delete captcha message failed gid=%s mid=%s: %s", chat_id, pending.message_id, e)
-        _store(context).pop((chat_id, user_id), None)
-        # cancel job
-        for jb in context.job_queue.get_jobs_by_name(f"verify:{chat_id}:{user_id}"):
-            jb.schedule_removal()
+        # Verified — restore group default permissions, unless the rules-accept mute still applies
+        log.info("CAPTCHA verified for user %s in chat %s", user_id, chat_id)
+        # Its heap entry is skipped by the sweeper once the pending record is gone
+        _pop_pending(_store(context), chat_id, user_id)
+        # A shared prompt keeps the other users' rows; a prompt for this user alone is deleted
+        clear, shared = _clear_prompt(context, chat_id, user_id, pending.message_id)
+        # Clear the prompt and unrestrict concurrently; neither depends on the other
+        calls = [clear] if pending.keep_muted else [clear, _unrestrict(context, chat_id, user_id)]
+        clear_res, *unrestrict_res = await asyncio.gather(*calls, return_exceptions=True)
+        if unrestrict_res and isinstance(unrestrict_res[0], Exception):
+            log.error("verify: unrestrict failed gid=%s uid=%s: %s", chat_id, user_id, unrestrict_res[0])
+        if isinstance(clear_res, Exception):
+            log.error(
+                "verify: %s captcha message failed gid=%s mid=%s: %s",
+                "trim shared" if shared else "delete", chat_id, pending.message_id, clear_res,
+            )
     else:
         # Wrong answer
-        log.info(f"Wrong CAPTCHA answer from user {user_id} in chat {chat_id}")
+        log.info("Wrong CAPTCHA answer from user %s in chat %s", user_id, chat_id)
         lang = I18N.pick_lang(update)
         await update.callback_query.answer(
             t(lang, "captcha.wrong_answer") or "❌ Wrong answer. Try again.",
@@ -169,30 +292,44 @@ async def on_captcha_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
 
 
-async def timeout_kick(context: ContextTypes.DEFAULT_TYPE) -> None:
-    data = context.job.data or {}
-    chat_id = data.get("chat_id")
-    user_id = data.get("user_id")
-    if chat_id is None or user_id is None:
-        return
-    # If still pending, kick
-    pending = _store(context).get((chat_id, user_id))
-    if not pending:
+async def _unrestrict(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int) -> None:
+    perms = await group_default_permissions(context, chat_id)
+    await context.bot.restrict_chat_member(chat_id, user_id, permissions=perms)
+
+
+async def _kick(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int) -> None:
+    await context.bot.ban_chat_member(chat_id, user_id)
+    await context.bot.unban_chat_member(chat_id, user_id)
+
+
+async def sweep_verify(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodic job: kick users whose CAPTCHA deadline has passed.
+
+    Only the head of the deadline heap is inspected, so a sweep costs nothing
+    while no CAPTCHA is due. Entries whose user already verified (or was
+    re-challenged with a later deadline) are dropped without action.
+    """
+    heap = context.bot_data.get("verify_heap")
+    if not heap:
         return
+    store = _store(context)
+    now = time.time()
+    while heap and heap[0][0] <= now:
+        _, chat_id, user_id = heapq.heappop(heap)
+        pending = store.get(chat_id, _EMPTY).get(user_id)
+        if pending and pending.deadline <= now:
+            await timeout_kick(context, chat_id, user_id, pending)
+
+
+async def timeout_kick(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, pending: Pending) -> None:
+    log.info("CAPTCHA timeout for user %s in chat %s, kicking user", user_id, chat_id)
+    _pop_pending(_store(context), chat_id, user_id)
     
-    log.info(f"CAPTCHA timeout for user {user_id} in chat {chat_id}, kicking user")
-    
-    # Try to delete the CAPTCHA message
-    try:
-        await context.bot.delete_message(chat_id, pending.message_id)
-    except Exception as e:
-        log.warning(f"Failed to delete CAPTCHA message on timeout: {e}")
-    
-    # Kick the user
-    try:
-        await context.bot.ban_chat_member(chat_id, user_id)
-        await context.bot.unban_chat_member(chat_id, user_id)
-    except Exception as e:
-        log.exception("verify: timeout kick failed gid=%s uid=%s: %s", chat_id, user_id, e)
-    
-    _store(context).pop((chat_id, user_id), None)
+    # Kick the user and drop their row from the prompt (or the whole prompt) concurrently
+    clear, shared = _clear_prompt(context, chat_id, user_id, pending.message_id)
+    calls = [_kick(context, chat_id, user_id), clear]
+    kick_res, clear_res = await asyncio.gather(*calls, return_exceptions=True)
+    if isinstance(kick_res, Exception):
+        log.error("verify: timeout kick failed gid=%s uid=%s: %s", chat_id, user_id, kick_res)
+    if isinstance(clear_res, Exception):
+        log.warning("Failed to %s CAPTCHA message on timeout: %s", "trim shared" if shared else "delete", clear_res)
@@ -6,5 +6,5 @@ from .handlers import on_chat_member
 
 
 def register(app: Application) -> None:
-    app.add_handler(ChatMemberHandler(on_chat_member))
+    app.add_handler(ChatMemberHandler(on_chat_member, ChatMemberHandler.CHAT_MEMBER))
 
@@ -1,15 +1,25 @@
 from __future__ import annotations
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatPermissions
-import base64
+from telegram import ChatMember, Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatPermissions
 from telegram.ext import ContextTypes
+import asyncio
 import logging
 
+from ...core import delete_scheduler
 from ...core.i18n import I18N, t
-from ...infra.settings_repo import SettingsRepo
-from ...infra import db
+from ...core.utils import bot_username, render_template, rules_payload, user_mention_html
+from ...infra import settings_repo
+from ..verification.handlers import handle_join as verify_join
 log = logging.getLogger(__name__)
 
+# Statuses that count as being in the chat (restricted members are checked via is_member)
+_MEMBER_STATUSES = frozenset({ChatMember.MEMBER, ChatMember.ADMINISTRATOR, ChatMember.OWNER})
+
+
+def _is_member(member: ChatMember) -> bool:
+    status = member.status
+    return status in _MEMBER_STATUSES or (status == ChatMember.RESTRICTED and getattr(member, "is_member", False))
+
 
 async def on_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.chat_member:
@@ -17,56 +27,56 @@ async def on_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     cm = update.chat_member
     if not cm.new_chat_member or not update.effective_chat:
         return
-    # Welcome only on join
-    if cm.old_chat_member and cm.old_chat_member.status == cm.new_chat_member.status:
-        return
     user = cm.new_chat_member.user
+    # Welcome only on join, and never for bots; checked before any settings lookup
+    if user.is_bot or not _is_member(cm.new_chat_member) or (cm.old_chat_member and _is_member(cm.old_chat_member)):
+        return
+    # Approved join requests were already challenged, muted and welcomed by onboarding
+    if cm.via_join_request:
+        return
     lang = I18N.pick_lang(update)
-    template = None
-    async with db.SessionLocal() as s:  # type: ignore
-        cfg = await SettingsRepo(s).get(update.effective_chat.id, "welcome") or {}
-        template = cfg.get("template")
-        enabled = cfg.get("enabled", True)
-        ttl = int(cfg.get("ttl_sec", 0) or 0)
-        ob = await SettingsRepo(s).get(update.effective_chat.id, "onboarding") or {}
-        # Default to require unmute unless pre-approval acceptance is enabled
-        require_unmute = bool(ob.get("require_accept_unmute", True)) and not bool(ob.get("require_accept", False))
+    # CAPTCHA and welcome settings come from one cached lookup (a single query on a miss)
+    cfgs = await settings_repo.get_cached(update.effective_chat.id, ("captcha", "welcome", "onboarding"))
+    cfg = cfgs.get("welcome") or {}
+    template = cfg.get("template")
+    enabled = cfg.get("enabled", True)
+    ttl = int(cfg.get("ttl_sec", 0) or 0)
+    ob = cfgs.get("onboarding") or {}
+    # Default to require unmute unless pre-approval acceptance is enabled
+    require_unmute = bool(ob.get("require_accept_unmute", True)) and not bool(ob.get("require_accept", False))
+    # Only groups that explicitly set require_accept_unmute keep a CAPTCHA pass from lifting the mute
+    keep_muted = enabled and require_unmute and ob.get("require_accept_unmute") is True
+    try:
+        await verify_join(update, context, cfgs.get("captcha"), keep_muted=keep_muted)
+    except Exception as e:
+        log.exception("CAPTCHA on join failed gid=%s uid=%s: %s", update.effective_chat.id, user.id, e)
     if not enabled:
         return
     # If require_unmute is enabled: restrict and instruct to accept rules via deep-link
     if require_unmute:
+        # Mute runs concurrently with building and posting the welcome; checked once that is done
+        mute = asyncio.create_task(
+            context.bot.restrict_chat_member(update.effective_chat.id, user.id, permissions=ChatPermissions(can_send_messages=False))
+        )
         try:
-            await context.bot.restrict_chat_member(update.effective_chat.id, user.id, permissions=ChatPermissions(can_send_messages=False))
-        except Exception as e:
-            log.exception("Failed to mute on welcome gid=%s uid=%s: %s", update.effective_chat.id, user.id, e)
-        try:
-            bot_username = (await context.bot.get_me()).username or ""
-            payload = (
-                f"rulesu_{update.effective_chat.username}"
-                if getattr(update.effective_chat, "username", None)
-                else f"rules64_{base64.urlsafe_b64encode(str(update.effective_chat.id).encode()).decode().rstrip('=')}"
-            )
-            deep = f"https://t.me/{bot_username}?start={payload}"
+            username = await bot_username(context)
+            payload = rules_payload(update.effective_chat.id, getattr(update.effective_chat, "username", None))
+            deep = f"https://t.me/{username}?start={payload}"
             
             # Create user mention using ID - proper HTML format
-            user_mention = f'<a href="tg://user?id={user.id}">{user.first_name or "Member"}</a>'
+            user_mention = user_mention_html(user)
             
             # Check if admin has set a custom template
             if template:
                 # Process admin's custom template
-                custom_text = template.replace("{first_name}", user.first_name or "Member")
-                custom_text = custom_text.replace("{user_mention}", user_mention)
-                
-                # Format other placeholders
-                try:
-                    custom_text = custom_text.format(
-                        group_title=update.effective_chat.title or "",
-                        user_id=user.id,
-                        username=f"@{user.username}" if user.username else ""
-                    )
-                except KeyError:
-                    # If formatting fails, just use the template with basic replacements
-                    pass
+                custom_text = render_template(
+                    template,
+                    first_name=user.first_name or "Member",
+                    user_mention=user_mention,
+                    group_title=update.effective_chat.title or "",
+                    user_id=user.id,
+                    username=f"@{user.username}" if user.username else "",
+                )
                 
                 # ALWAYS add welcome header with user mention (localized)
                 header = t(lang, "welcome.header_greeting", user_mention=user_mention)
@@ -95,18 +105,17 @@ async def on_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             kb = InlineKeyboardMarkup([[InlineKeyboardButton(t(lang, "welcome.read_accept"), url=deep)]])
             m = await context.bot.send_message(update.effective_chat.id, text, reply_markup=kb, parse_mode="HTML")
             if ttl and ttl > 0:
-                async def _del(ctx: ContextTypes.DEFAULT_TYPE):
-                    try:
-                        await ctx.bot.delete_message(update.effective_chat.id, m.message_id)
-                    except Exception as e:
-                        log.exception("Failed to auto-delete welcome gid=%s mid=%s: %s", update.effective_chat.id, m.message_id, e)
-                context.job_queue.run_once(_del, when=ttl)
+                delete_scheduler.schedule(context.bot, ttl, update.effective_chat.id, m.message_id)
         except Exception as e:
             log.exception("Failed sending welcome with deep-link gid=%s: %s", update.effective_chat.id, e)
+        try:
+            await mute
+        except Exception as e:
+            log.exception("Failed to mute on welcome gid=%s uid=%s: %s", update.effective_chat.id, user.id, e)
         return
     # Regular welcome with professional formatting
     # Create user mention using ID (works even without username)
-    user_mention = f'<a href="tg://user?id={user.id}">{user.first_name or "Member"}</a>'
+    user_mention = user_mention_html(user)
     
     # Professional default welcome template
     default_welcome = (
@@ -119,19 +128,14 @@ async def on_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     if template:
         # Process admin's custom template
-        custom_text = template.replace("{first_name}", user.first_name or "Member")
-        custom_text = custom_text.replace("{user_mention}", user_mention)
-        
-        # Format other placeholders
-        try:
-            custom_text = custom_text.format(
-                group_title=update.effective_chat.title or "",
-                user_id=user.id,
-                username=f"@{user.username}" if user.username else ""
-            )
-        except KeyError:
-            # If formatting fails, just use the template with basic replacements
-            pass
+        custom_text = render_template(
+            template,
+            first_name=user.first_name or "Member",
+            user_mention=user_mention,
+            group_title=update.effective_chat.title or "",
+            user_id=user.id,
+            username=f"@{user.username}" if user.username else "",
+        )
         
         # ALWAYS add welcome header with user mention (localized)
         header = t(lang, "welcome.header_celebration", user_mention=user_mention)
@@ -141,9 +145,4 @@ async def on_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     m = await context.bot.send_message(update.effective_chat.id, text, parse_mode="HTML")
     if ttl and ttl > 0:
-        async def _del2(ctx: ContextTypes.DEFAULT_TYPE):
-            try:
-                await ctx.bot.delete_message(update.effective_chat.id, m.message_id)
-            except Exception as e:
-                log.exception("Failed to auto-delete welcome (regular) gid=%s mid=%s: %s", update.effective_chat.id, m.message_id, e)
-        context.job_queue.run_once(_del2, when=ttl)
+        delete_scheduler.schedule(context.bot, ttl, update.effective_chat.id, m.message_id)
@@ -1,19 +1,70 @@
 from __future__ import annotations
 
 import asyncio
+import logging
 from typing import Optional
 
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 
+log = logging.getLogger(__name__)
+
 engine: Optional[AsyncEngine] = None
 SessionLocal: Optional[async_sessionmaker[AsyncSession]] = None
 
+# Persistent connections kept open for file-backed databases
+POOL_SIZE = 10
+POOL_MAX_OVERFLOW = 10
+POOL_RECYCLE_SEC = 1800
+# Per-connection prepared statement cache (sqlite3's default is 128)
+STATEMENT_CACHE_SIZE = 512
+# Per-connection PRAGMAs applied as each pooled SQLite handle is opened
+SQLITE_CONNECT_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA temp_store=MEMORY",
+)
+
 
 async def init_engine(dsn: str) -> None:
     global engine
     if engine is None:
-        engine = create_async_engine(dsn, future=True, echo=False)
+        pool_kwargs: dict = {}
+        if make_url(dsn).database not in (None, "", ":memory:"):
+            pool_kwargs = dict(
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=POOL_SIZE,
+                max_overflow=POOL_MAX_OVERFLOW,
+                pool_recycle=POOL_RECYCLE_SEC,
+                pool_pre_ping=False,
+            )
+            if make_url(dsn).get_backend_name() == "sqlite":
+                pool_kwargs["connect_args"] = {"cached_statements": STATEMENT_CACHE_SIZE}
+        engine = create_async_engine(dsn, future=True, echo=False, **pool_kwargs)
+        if engine.url.get_backend_name() == "sqlite":
+            event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+
+def _apply_sqlite_pragmas(dbapi_conn, _record) -> None:  # type: ignore[no-untyped-def]
+    cur = dbapi_conn.cursor()
+    try:
+        for pragma in SQLITE_CONNECT_PRAGMAS:
+            cur.execute(pragma)
+    finally:
+        cur.close()
+
+
+async def warm_pool() -> None:
+    """Open POOL_SIZE connections up front so early requests skip the connect cost."""
+    assert engine is not None
+    if not isinstance(engine.pool, AsyncAdaptedQueuePool):
+        return
+    conns = await asyncio.gather(*(engine.connect() for _ in range(POOL_SIZE)))
+    await asyncio.gather(*(c.close() for c in conns))
+    log.debug("DB pool warmed: %s", engine.pool.status())
 
 
 def init_sessionmaker() -> None:
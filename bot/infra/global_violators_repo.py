@@ -6,7 +6,7 @@ import logging
 from datetime import datetime, timedelta
 from typing import Optional, List
 
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, literal, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .models import GlobalViolator
@@ -27,32 +27,39 @@ class GlobalViolatorsRepo:
     ) -> GlobalViolator:
         """Add or update a global violator record."""
         violator = await self.s.get(GlobalViolator, user_id)
+        # One timestamp for every field touched by this violation
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=duration_seconds) if duration_seconds else None
         
         if violator is None:
             # First violation
-            expires_at = None
-            if duration_seconds:
-                expires_at = datetime.utcnow() + timedelta(seconds=duration_seconds)
-            
             violator = GlobalViolator(
                 user_id=user_id,
                 violation_count=1,
-                first_violation=datetime.utcnow(),
-                last_violation=datetime.utcnow(),
+                first_violation=now,
+                last_violation=now,
                 matched_words=[matched_word],
                 action=action,
                 expires_at=expires_at
             )
             self.s.add(violator)
+        elif violator.expires_at and now > violator.expires_at:
+            # Expired record not yet cleaned up: start over as a first violation
+            violator.violation_count = 1
+            violator.first_violation = now
+            violator.last_violation = now
+            violator.matched_words = [matched_word]
+            violator.action = action
+            violator.expires_at = expires_at
         else:
             # Additional violation - update the record
             violator.violation_count += 1
-            violator.last_violation = datetime.utcnow()
+            violator.last_violation = now
             
-            # Track matched words (keep last 10)
-            if matched_word not in violator.matched_words:
-                violator.matched_words = (violator.matched_words or []) + [matched_word]
-                violator.matched_words = violator.matched_words[-10:]  # Keep last 10
+            # Track matched words (keep last 10); the JSON column is only rewritten for a new word
+            words = violator.matched_words or []
+            if matched_word not in words:
+                violator.matched_words = [*words[-9:], matched_word]
             
             # Update action if it's more severe
             severity_order = {"warn": 0, "mute": 1, "ban": 2}
@@ -60,10 +67,8 @@ class GlobalViolatorsRepo:
                 violator.action = action
             
             # Update expiry if new duration is longer
-            if duration_seconds:
-                new_expires = datetime.utcnow() + timedelta(seconds=duration_seconds)
-                if violator.expires_at is None or new_expires > violator.expires_at:
-                    violator.expires_at = new_expires
+            if expires_at and (violator.expires_at is None or expires_at > violator.expires_at):
+                violator.expires_at = expires_at
         
         return violator
 
@@ -71,20 +76,23 @@ class GlobalViolatorsRepo:
         """Get a global violator record."""
         violator = await self.s.get(GlobalViolator, user_id)
         
-        # Check if expired
-        if violator and violator.expires_at:
-            if datetime.utcnow() > violator.expires_at:
-                # Expired - remove the record
-                await self.s.delete(violator)
-                await self.s.commit()
-                return None
+        # Expired records read as absent; cleanup_expired removes them in the background
+        if violator and violator.expires_at and datetime.utcnow() > violator.expires_at:
+            return None
         
         return violator
 
     async def is_violator(self, user_id: int) -> bool:
         """Check if user is a current global violator."""
-        violator = await self.get_violator(user_id)
-        return violator is not None
+        q = (
+            select(literal(1))
+            .where(
+                GlobalViolator.user_id == user_id,
+                or_(GlobalViolator.expires_at.is_(None), GlobalViolator.expires_at > datetime.utcnow()),
+            )
+            .limit(1)
+        )
+        return (await self.s.execute(q)).scalar() is not None
 
     async def remove_violator(self, user_id: int) -> bool:
         """Remove a user from global violators list."""
@@ -96,27 +104,14 @@ class GlobalViolatorsRepo:
 
     async def list_violators(self, limit: int = 100) -> List[GlobalViolator]:
         """List all current global violators."""
+        current_time = datetime.utcnow()
         result = await self.s.execute(
             select(GlobalViolator)
+            .where(or_(GlobalViolator.expires_at.is_(None), GlobalViolator.expires_at > current_time))
             .order_by(GlobalViolator.last_violation.desc())
             .limit(limit)
         )
-        violators = result.scalars().all()
-        
-        # Filter out expired ones
-        current_time = datetime.utcnow()
-        active_violators = []
-        for v in violators:
-            if v.expires_at is None or v.expires_at > current_time:
-                active_violators.append(v)
-            else:
-                # Clean up expired
-                await self.s.delete(v)
-        
-        if len(active_violators) < len(violators):
-            await self.s.commit()
-        
-        return active_violators
+        return list(result.scalars().all())
 
     async def cleanup_expired(self) -> int:
         """Remove all expired violator records."""
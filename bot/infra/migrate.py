@@ -1,8 +1,7 @@
 from __future__ import annotations
 
 import logging
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.sqlite import insert
 
 from . import db
 from .models import Base, Group
@@ -14,34 +13,35 @@ async def migrate() -> None:
     assert db.engine is not None, "Engine not initialized"
     async with db.engine.begin() as conn:  # type: ignore
         await conn.run_sync(Base.metadata.create_all)
+        # create_all skips tables that already exist, so add indexes declared since separately
+        await conn.run_sync(_create_missing_indexes)
     await db.set_sqlite_pragmas()
     
     # Create special group entry for global settings (group_id=0)
     await ensure_global_group()
 
 
+def _create_missing_indexes(conn) -> None:
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
 async def ensure_global_group() -> None:
     """Ensure the special global settings group (id=0) exists."""
     try:
+        # Single INSERT ... ON CONFLICT DO NOTHING instead of SELECT-then-INSERT
+        stmt = insert(Group).values(
+            id=0,
+            title="__GLOBAL_SETTINGS__",
+            type="private",  # Use private type since it's not a real group
+        ).on_conflict_do_nothing(index_elements=[Group.id])
         async with db.SessionLocal() as session:  # type: ignore
-            # Check if global group exists
-            result = await session.execute(
-                select(Group).where(Group.id == 0)
-            )
-            global_group = result.scalar_one_or_none()
-            
-            if not global_group:
-                # Create global group for bot-wide settings
-                global_group = Group(
-                    id=0,
-                    title="__GLOBAL_SETTINGS__",
-                    type="private"  # Use private type since it's not a real group
-                )
-                session.add(global_group)
-                await session.commit()
-                log.info("Created global settings group (id=0)")
-            else:
-                log.debug("Global settings group already exists")
-                
+            result = await session.execute(stmt)
+            await session.commit()
+        if result.rowcount:
+            log.info("Created global settings group (id=0)")
+        else:
+            log.debug("Global settings group already exists")
     except Exception as e:
-        log.error(f"Error ensuring global group: {e}")
+        log.error("Error ensuring global group: %s", e)
@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import BigInteger, JSON, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import BigInteger, JSON, Index, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -19,6 +19,7 @@ class Group(Base):
     type: Mapped[str] = mapped_column(String(32))
     language: Mapped[Optional[str]] = mapped_column(String(8), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index("ix_groups_username", "username"),)
 
 
 class GroupSetting(Base):
@@ -38,6 +39,7 @@ class GroupAdmin(Base):
     status: Mapped[str] = mapped_column(String(32))
     rights: Mapped[dict] = mapped_column(JSON)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index("ix_group_admins_user", "user_id"),)
 
 
 class User(Base):
@@ -58,6 +60,7 @@ class Warn(Base):
     reason: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     created_by: Mapped[int] = mapped_column(BigInteger)
+    __table_args__ = (Index("ix_warns_group_user", "group_id", "user_id"),)
 
 
 class Mute(Base):
@@ -68,6 +71,7 @@ class Mute(Base):
     reason: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     created_by: Mapped[int] = mapped_column(BigInteger)
+    __table_args__ = (Index("ix_mutes_group_user", "group_id", "user_id"),)
 
 
 class Ban(Base):
@@ -78,6 +82,7 @@ class Ban(Base):
     reason: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     created_by: Mapped[int] = mapped_column(BigInteger)
+    __table_args__ = (Index("ix_bans_group_user", "group_id", "user_id"),)
 
 
 class Filter(Base):
@@ -90,6 +95,7 @@ class Filter(Base):
     added_by: Mapped[int] = mapped_column(BigInteger)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     extra: Mapped[dict] = mapped_column(JSON, default=dict)
+    __table_args__ = (Index("ix_filters_group", "group_id"),)
 
 
 class AuditLog(Base):
@@ -101,6 +107,7 @@ class AuditLog(Base):
     target_user_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
     extra: Mapped[dict] = mapped_column(JSON)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index("ix_audit_log_group", "group_id"),)
 
 
 class Job(Base):
@@ -111,6 +118,7 @@ class Job(Base):
     payload: Mapped[dict] = mapped_column(JSON)
     run_at: Mapped[datetime] = mapped_column(DateTime)
     interval_sec: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    __table_args__ = (Index("ix_jobs_group_run_at", "group_id", "run_at"),)
 
 
 class GlobalViolator(Base):
@@ -123,3 +131,4 @@ class GlobalViolator(Base):
     action: Mapped[str] = mapped_column(String(32))  # warn, mute, ban
     expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)  # When penalty expires
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # Admin notes
+    __table_args__ = (Index("ix_global_violators_expires_at", "expires_at"),)
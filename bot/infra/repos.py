@@ -4,6 +4,7 @@ from datetime import datetime
 from typing import Iterable, Optional
 
 from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .models import Group, GroupAdmin, User, AuditLog, Filter, Job
@@ -14,12 +15,17 @@ class GroupsRepo:
         self.s = session
 
     async def upsert_group(self, gid: int, title: str, username: Optional[str], gtype: str) -> None:
-        g = await self.s.get(Group, gid)
-        if g is None:
-            self.s.add(Group(id=gid, title=title, username=username, type=gtype))
-        else:
-            g.title = title
-            g.username = username
+        stmt = insert(Group).values(id=gid, title=title, username=username, type=gtype)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Group.id],
+            set_={"title": stmt.excluded.title, "username": stmt.excluded.username},
+        )
+        await self.s.execute(stmt)
+
+    async def gid_by_username(self, username: str) -> Optional[int]:
+        """Id of the known group with this public username, if any."""
+        q = select(Group.id).where(Group.username == username).limit(1)
+        return (await self.s.execute(q)).scalar()
 
     async def list_admin_groups(self, user_id: int) -> list[Group]:
         q = select(Group).join(GroupAdmin, GroupAdmin.group_id == Group.id).where(
@@ -28,23 +34,29 @@ class GroupsRepo:
         rows = (await self.s.execute(q)).scalars().all()
         return list(rows)
 
+    async def has_admin_groups(self, user_id: int) -> bool:
+        """Whether the user administers any group; an index probe instead of loading the groups."""
+        q = select(GroupAdmin.group_id).where(GroupAdmin.user_id == user_id).limit(1)
+        return (await self.s.execute(q)).first() is not None
+
 
 class GroupAdminsRepo:
     def __init__(self, session: AsyncSession) -> None:
         self.s = session
 
     async def upsert_admin(self, group_id: int, user_id: int, status: str, rights: dict) -> None:
-        admin = await self.s.get(GroupAdmin, {"group_id": group_id, "user_id": user_id})
-        if admin is None:
-            self.s.add(
-                GroupAdmin(
-                    group_id=group_id, user_id=user_id, status=status, rights=rights, updated_at=datetime.utcnow()
-                )
-            )
-        else:
-            admin.status = status
-            admin.rights = rights
-            admin.updated_at = datetime.utcnow()
+        stmt = insert(GroupAdmin).values(
+            group_id=group_id, user_id=user_id, status=status, rights=rights, updated_at=datetime.utcnow()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[GroupAdmin.group_id, GroupAdmin.user_id],
+            set_={
+                "status": stmt.excluded.status,
+                "rights": stmt.excluded.rights,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        await self.s.execute(stmt)
 
     async def delete_admin(self, group_id: int, user_id: int) -> None:
         admin = await self.s.get(GroupAdmin, {"group_id": group_id, "user_id": user_id})
@@ -64,43 +76,26 @@ class UsersRepo:
         last_name: Optional[str],
         language: Optional[str],
     ) -> None:
-        from sqlalchemy.exc import IntegrityError
-        
-        # Try to get existing user first
-        u = await self.s.get(User, uid)
-        if u is None:
-            # User doesn't exist, try to create
-            try:
-                self.s.add(
-                    User(
-                        id=uid,
-                        username=username,
-                        first_name=first_name,
-                        last_name=last_name,
-                        language=language,
-                        seen_at=datetime.utcnow(),  # Explicitly set seen_at for new users
-                    )
-                )
-                # Flush to catch IntegrityError before commit
-                await self.s.flush()
-            except IntegrityError:
-                # Another request already created the user, rollback and fetch it
-                await self.s.rollback()
-                u = await self.s.get(User, uid)
-                if u:
-                    # Update the existing user
-                    u.username = username
-                    u.first_name = first_name
-                    u.last_name = last_name
-                    u.language = language
-                    u.seen_at = datetime.utcnow()
-        else:
-            # User exists, update it
-            u.username = username
-            u.first_name = first_name
-            u.last_name = last_name
-            u.language = language
-            u.seen_at = datetime.utcnow()  # Update seen_at for existing users
+        # One statement on both paths; concurrent first sightings no longer race into IntegrityError
+        stmt = insert(User).values(
+            id=uid,
+            username=username,
+            first_name=first_name,
+            last_name=last_name,
+            language=language,
+            seen_at=datetime.utcnow(),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.id],
+            set_={
+                "username": stmt.excluded.username,
+                "first_name": stmt.excluded.first_name,
+                "last_name": stmt.excluded.last_name,
+                "language": stmt.excluded.language,
+                "seen_at": stmt.excluded.seen_at,
+            },
+        )
+        await self.s.execute(stmt)
 
 
 class AuditRepo:
@@ -131,8 +126,8 @@ class FiltersRepo:
         f = Filter(
             group_id=group_id, type=ftype, pattern=pattern, action=action, added_by=added_by, extra=extra or {}
         )
+        # .id is assigned when the caller commits; every caller reads it only after that
         self.s.add(f)
-        await self.s.flush()
         return f
     
     async def list_rules(self, group_id: int, limit: int = 100) -> list[Filter]:
@@ -176,13 +171,10 @@ class WarnsRepo:
         return int((await self.s.execute(q)).scalar_one())
 
     async def reset(self, group_id: int, user_id: int) -> None:
-        from sqlalchemy import select
+        from sqlalchemy import delete
         from .models import Warn
 
-        q = select(Warn).where(Warn.group_id == group_id, Warn.user_id == user_id)
-        rows = (await self.s.execute(q)).scalars().all()
-        for r in rows:
-            await self.s.delete(r)
+        await self.s.execute(delete(Warn).where(Warn.group_id == group_id, Warn.user_id == user_id))
 
 
 class JobsRepo:
@@ -191,8 +183,8 @@ class JobsRepo:
 
     async def add(self, group_id: int, kind: str, payload: dict, run_at, interval_sec: int | None) -> Job:
         j = Job(group_id=group_id, kind=kind, payload=payload, run_at=run_at, interval_sec=interval_sec)
+        # .id is assigned when the caller commits; every caller reads it only after that
         self.s.add(j)
-        await self.s.flush()
         return j
 
     async def list_by_group(self, group_id: int, limit: int = 50) -> list[Job]:
@@ -1,11 +1,107 @@
 from __future__ import annotations
 
-from typing import Any, Optional
+import copy
+import time
+from datetime import datetime
+from typing import Any, Iterable, Optional
 
-from sqlalchemy import select
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
-from .models import GroupSetting
+from . import db
+from .models import Group, GroupSetting
+
+# Settings that opt a group into join-request onboarding
+ONBOARDING_KEYS = ("auto_approve_join", "onboarding")
+# Groups holding any ONBOARDING_KEYS row; None until loaded at startup
+onboarding_gids: Optional[set[int]] = None
+
+# Seconds a cached setting is reused before hitting the DB again
+CACHE_TTL = 30
+# Entry cap; a full cache first drops expired entries, then starts over
+CACHE_MAX = 10_000
+# (group_id, key) -> (monotonic expiry, value or None when unset)
+_cache: dict[tuple[int, str], tuple[float, Optional[dict]]] = {}
+# group_id -> (monotonic expiry, stored group title), for get_rules_and_title
+_title_cache: dict[int, tuple[float, Optional[str]]] = {}
+# (group_id, key) -> count of committed writes; one entry per setting ever written in this process
+_generation: dict[tuple[int, str], int] = {}
+
+
+def _remember(cache: dict, k: Any, value: Any, expiry: float) -> None:
+    if len(cache) >= CACHE_MAX:
+        now = time.monotonic()
+        for old in [old for old, (exp, _) in cache.items() if exp <= now]:
+            del cache[old]
+        if len(cache) >= CACHE_MAX:
+            cache.clear()
+    cache[k] = (expiry, value)
+
+
+def _remember_if_current(k: tuple[int, str], generation: int, value: Any, expiry: float) -> None:
+    """Cache a value read from the DB unless a write to k committed since the read began."""
+    if _generation.get(k, 0) == generation:
+        _remember(_cache, k, value, expiry)
+
+
+def _bump(k: tuple[int, str]) -> None:
+    _generation[k] = _generation.get(k, 0) + 1
+    _cache.pop(k, None)
+
+
+# session.info key holding the (group_id, key) entries a session's pending writes touched
+_INVALIDATE = "settings_invalidate"
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    # Drop entries once the write is visible; bumping the generation also stops readers
+    # whose SELECT began before the commit from caching the old value afterwards
+    for k in session.info.pop(_INVALIDATE, ()):
+        _bump(k)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    # Nothing was written; the cached values are still current
+    session.info.pop(_INVALIDATE, None)
+
+
+def cache_clear() -> None:
+    """Drop every cached setting and title."""
+    _cache.clear()
+    _title_cache.clear()
+
+
+async def get_cached(group_id: int, keys: Iterable[str]) -> dict[str, dict]:
+    """Like SettingsRepo.get_many, but served from a short-lived in-process cache.
+
+    Meant for hot paths such as member joins; writes through SettingsRepo.set
+    drop the cached entry on commit so admins see their changes immediately.
+    The returned dicts are the cached objects themselves and must be treated
+    as read-only; use SettingsRepo.get for a copy to modify.
+    """
+    now = time.monotonic()
+    out: dict[str, dict] = {}
+    missing: list[str] = []
+    for key in keys:
+        hit = _cache.get((group_id, key))
+        if hit and hit[0] > now:
+            if hit[1] is not None:
+                out[key] = hit[1]
+        else:
+            missing.append(key)
+    if missing:
+        generations = [_generation.get((group_id, key), 0) for key in missing]
+        async with db.SessionLocal() as s:  # type: ignore
+            found = await SettingsRepo(s).get_many(group_id, missing)
+        expiry = now + CACHE_TTL
+        for key, generation in zip(missing, generations):
+            _remember_if_current((group_id, key), generation, found.get(key), expiry)
+        out.update(found)
+    return out
 
 
 class SettingsRepo:
@@ -13,22 +109,77 @@ class SettingsRepo:
         self.s = session
 
     async def get(self, group_id: int, key: str) -> Optional[dict]:
-        q = select(GroupSetting).where(GroupSetting.group_id == group_id, GroupSetting.key == key)
-        row = (await self.s.execute(q)).scalars().first()
-        return row.value if row else None
+        """Return a setting, served from the CACHE_TTL cache when fresh.
+
+        Callers get their own copy, so mutating it before set() cannot leak
+        into the cache.
+        """
+        # A key this session wrote but has not committed bypasses the cache both ways
+        uncommitted = (group_id, key) in self.s.info.get(_INVALIDATE, ())
+        hit = None if uncommitted else _cache.get((group_id, key))
+        if hit and hit[0] > time.monotonic():
+            return copy.deepcopy(hit[1])
+        generation = _generation.get((group_id, key), 0)
+        # Project the value column only; no ORM instance or identity-map entry is needed
+        q = select(GroupSetting.value).where(GroupSetting.group_id == group_id, GroupSetting.key == key)
+        value = (await self.s.execute(q)).scalar_one_or_none()
+        if not uncommitted:
+            _remember_if_current((group_id, key), generation, copy.deepcopy(value), time.monotonic() + CACHE_TTL)
+        return value
+
+    async def get_many(self, group_id: int, keys: Iterable[str]) -> dict[str, dict]:
+        """Fetch several settings for a group in one query; missing keys are absent."""
+        q = select(GroupSetting.key, GroupSetting.value).where(
+            GroupSetting.group_id == group_id, GroupSetting.key.in_(list(keys))
+        )
+        return {k: v for k, v in (await self.s.execute(q)).all()}
 
     async def set(self, group_id: int, key: str, value: dict) -> None:
-        q = select(GroupSetting).where(GroupSetting.group_id == group_id, GroupSetting.key == key)
-        row = (await self.s.execute(q)).scalars().first()
-        if row is None:
-            self.s.add(GroupSetting(group_id=group_id, key=key, value=value))
-        else:
-            row.value = value
+        now = datetime.utcnow()
+        stmt = insert(GroupSetting).values(group_id=group_id, key=key, value=value, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[GroupSetting.group_id, GroupSetting.key],
+            set_={"value": stmt.excluded.value, "updated_at": stmt.excluded.updated_at},
+        )
+        await self.s.execute(stmt)
+        # Invalidated by _invalidate_committed once the caller commits
+        self.s.info.setdefault(_INVALIDATE, set()).add((group_id, key))
+        if key in ONBOARDING_KEYS and onboarding_gids is not None:
+            onboarding_gids.add(group_id)
+
+    async def load_onboarding_gids(self) -> set[int]:
+        """Populate the module-level onboarding_gids set from the database."""
+        global onboarding_gids
+        q = select(GroupSetting.group_id).where(GroupSetting.key.in_(ONBOARDING_KEYS)).distinct()
+        onboarding_gids = set((await self.s.execute(q)).scalars().all())
+        return onboarding_gids
 
     async def get_text(self, group_id: int, key: str) -> Optional[str]:
         v = await self.get(group_id, key)
         return None if v is None else v.get("text")  # type: ignore[return-value]
 
+    async def get_rules_and_title(self, group_id: int) -> tuple[Optional[str], Optional[str]]:
+        """Return the group's rules text and stored title, cached for CACHE_TTL.
+
+        On a miss both come from a single query.
+        """
+        now = time.monotonic()
+        rules_hit = _cache.get((group_id, "rules"))
+        title_hit = _title_cache.get(group_id)
+        if rules_hit and rules_hit[0] > now and title_hit and title_hit[0] > now:
+            value, group_title = rules_hit[1], title_hit[1]
+        else:
+            generation = _generation.get((group_id, "rules"), 0)
+            rules = select(GroupSetting.value).where(
+                GroupSetting.group_id == group_id, GroupSetting.key == "rules"
+            )
+            title = select(Group.title).where(Group.id == group_id)
+            q = select(rules.scalar_subquery(), title.scalar_subquery())
+            value, group_title = (await self.s.execute(q)).one()
+            _remember_if_current((group_id, "rules"), generation, copy.deepcopy(value), now + CACHE_TTL)
+            _remember(_title_cache, group_id, group_title, now + CACHE_TTL)
+        return (None if value is None else value.get("text")), group_title
+
     async def set_text(self, group_id: int, key: str, text: str) -> None:
         await self.set(group_id, key, {"text": text})
 
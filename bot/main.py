@@ -1,26 +1,27 @@
 from __future__ import annotations
 
 import asyncio
+import base64
+import functools
 import logging
-from typing import List
+import os
+import time
+from pathlib import Path
 
-from telegram import BotCommand, Update
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.constants import ParseMode
 from telegram.ext import (
     AIORateLimiter,
     Application,
     ApplicationBuilder,
-    CallbackQueryHandler,
-    ChatJoinRequestHandler,
-    ChatMemberHandler,
     CommandHandler,
     ContextTypes,
-    MessageHandler,
-    filters,
 )
 
+from .core import delete_scheduler
 from .core.config import settings
 from .core.i18n import I18N, t
+from .core.json_request import build_requests
 from .core.logging_config import setup_logging, get_logger
 from .core.error_handler import setup_error_handlers
 from .core.backup import schedule_backups, manual_backup_command
@@ -29,8 +30,12 @@ from .core.command_handler import register_command_handlers
 
 log = get_logger(__name__)
 from .core.user_tracker import register_user_tracking
-from .infra.db import init_engine, init_sessionmaker
+from .core.utils import cached_get_chat, user_mention_html
+from .infra import db
+from .infra.db import init_engine, init_sessionmaker, warm_pool
 from .infra.migrate import migrate
+from .infra.repos import GroupsRepo, UsersRepo
+from .infra.settings_repo import SettingsRepo
 from .features.moderation import register as register_moderation
 from .features.welcome import register as register_welcome
 from .features.antispam import register as register_antispam
@@ -40,17 +45,39 @@ from .features.automations.handlers import load_jobs
 from .features.admin_panel import register as register_admin_panel
 from .core.admin_sync import register as register_admin_sync
 from .features.onboarding import register as register_onboarding
+from .features.onboarding.handlers import (
+    load_onboarding_groups,
+    mark_rules_sent,
+    pop_join_rules_msg,
+    remember_join_rules_msg,
+    return_group_kb,
+    rules_recently_sent,
+)
 from .features.verification import register as register_verification
 from .features.topics import register as register_topics
 from .features.bot_admin import register as register_bot_admin
 from .features.global_enforcement import register as register_global_enforcement
 from .features.ai_response import register_handlers as register_ai_response
+from .features.privacy import privacy
+
+# Update types requested from Telegram when polling. chat_member is consumed by welcome
+# (which drives the join CAPTCHA) and user_tracker; my_chat_member by admin_sync, whose
+# ChatMemberHandlers use PTB's default MY_CHAT_MEMBER type, and user_tracker
+_ALLOWED_UPDATES: tuple[str, ...] = (
+    "message",
+    "callback_query",
+    "chat_member",
+    "my_chat_member",
+    "chat_join_request",
+)
 
 
 async def on_startup(app: Application) -> None:
     await migrate()  # ensure DB and pragmas
-    await set_bot_commands(app)
-    await load_jobs(app)
+    # Independent startup work overlapped: pool warm-up, DB reads on their own sessions, Bot API call
+    await asyncio.gather(
+        warm_pool(), load_jobs(app), load_onboarding_groups(app), set_bot_commands(app)
+    )
     schedule_backups(app)  # Schedule database backups
 
 
@@ -72,17 +99,30 @@ async def set_bot_commands(app: Application) -> None:
 
 
 def make_app() -> Application:
-    setup_logging()
     I18N.load_locales()
 
-    app = (
+    builder = (
         ApplicationBuilder()
         .token(settings.BOT_TOKEN)
-        # .rate_limiter(AIORateLimiter())  # Disabled until dependency is installed
-        .concurrent_updates(True)
+        # Telegram's limits: ~30 msg/s overall and 20 msg/min per group
+        .rate_limiter(
+            AIORateLimiter(
+                overall_max_rate=30, overall_time_period=1, group_max_rate=20, group_time_period=60
+            )
+        )
+        # 256 matches PTB's own limit for concurrent_updates(True); the setting only makes it tunable
+        .concurrent_updates(settings.MAX_CONCURRENT_UPDATES or 256)
         .post_init(on_startup)
-        .build()
     )
+    if settings.BOT_API_URL:
+        # Talk to a colocated telegram-bot-api server instead of api.telegram.org
+        api_url = settings.BOT_API_URL.rstrip("/")
+        builder = builder.base_url(f"{api_url}/bot").base_file_url(f"{api_url}/file/bot").local_mode(True)
+    requests = build_requests()
+    if requests:
+        # orjson-backed response decoding when the optional dependency is installed
+        builder = builder.request(requests[0]).get_updates_request(requests[1])
+    app = builder.build()
 
     # Register user tracking first (highest priority)
     register_user_tracking(app)
@@ -95,7 +135,6 @@ def make_app() -> Application:
     app.add_handler(CommandHandler("help", new_help_command))
     
     # Privacy command
-    from .features.privacy import privacy
     app.add_handler(CommandHandler("privacy", privacy))
     
     # Admin backup command
@@ -121,10 +160,7 @@ def make_app() -> Application:
     register_topics(app)
     register_ai_response(app)  # Register AI response handlers
 
-    # Events & callbacks - catch unhandled callbacks to prevent errors
-    async def _noop(_: Update, __: ContextTypes.DEFAULT_TYPE) -> None:
-        return None
-    app.add_handler(CallbackQueryHandler(_noop), group=10)
+    # Callback queries no handler matches are dropped by PTB without error
 
     # Set up error handling
     setup_error_handlers(app)
@@ -132,17 +168,80 @@ def make_app() -> Application:
     return app
 
 
+async def _rules_and_title(gid: int) -> tuple[str | None, str | None]:
+    async with db.SessionLocal() as s:  # type: ignore
+        return await SettingsRepo(s).get_rules_and_title(gid)
+
+
+async def _gid_from_username(context: ContextTypes.DEFAULT_TYPE, uname: str) -> int | None:
+    # Deep links carry the username the bot itself put there, so the in-memory gid -> username map
+    # (seeded from the groups table, kept current by user_tracker) normally resolves it
+    for gid, known in context.bot_data.get("_gu_map", {}).items():
+        if known == uname:
+            return gid
+    # Groups the bot is in are recorded with their username; only unknown ones need the Bot API
+    try:
+        async with db.SessionLocal() as s:  # type: ignore
+            gid = await GroupsRepo(s).gid_by_username(uname)
+        if gid is not None:
+            return gid
+    except Exception as e:
+        log.error("Local username lookup failed for %s: %s", uname, e)
+    try:
+        return (await cached_get_chat(context, f"@{uname}")).id
+    except Exception as e:
+        log.info("get_chat by username failed for %s: %s", uname, e, exc_info=log.isEnabledFor(logging.DEBUG))
+        return None
+
+
+async def _gid_from_b64(_: ContextTypes.DEFAULT_TYPE, data: str) -> int | None:
+    # Add padding back for urlsafe b64
+    pad = '=' * (-len(data) % 4)
+    try:
+        return int(base64.urlsafe_b64decode(data + pad).decode())
+    except Exception as e:
+        log.info("Failed to decode rules64 payload '%s': %s", data, e, exc_info=log.isEnabledFor(logging.DEBUG))
+        return None
+
+
+async def _gid_from_int(_: ContextTypes.DEFAULT_TYPE, data: str) -> int | None:
+    try:
+        return int(data)
+    except ValueError:
+        return None
+
+
+# Seconds during which a repeated bare /start in a private chat is ignored
+PRIVATE_START_COOLDOWN = 10
+
+# Base64 join payloads ("join_accept_<gid>_<uid>" / "join_decline_<gid>_<uid>") always start
+# with one of these; both prefixes are 12 bytes, so they encode to whole base64 blocks
+_JOIN_B64_PREFIXES = tuple(
+    base64.urlsafe_b64encode(p).decode() for p in (b"join_accept_", b"join_decline")
+)
+
+# /start payload prefix -> parser returning the target group id (None if unusable)
+_RULES_PARAM_PARSERS = (
+    ("rulesu_", _gid_from_username),
+    ("rules64_", _gid_from_b64),
+    ("rules_", _gid_from_int),
+)
+
+
+@functools.lru_cache(maxsize=16)
+def _private_kb(lang: str) -> InlineKeyboardMarkup:
+    """Updates/manage keyboard shown by /start and /help in private chats, built once per language."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(t(lang, "bot.button.updates"), url="https://t.me/tahikal")],
+        [InlineKeyboardButton(t(lang, "bot.button.manage"), callback_data="panel:back")]
+    ])
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     lang = I18N.pick_lang(update, fallback=settings.DEFAULT_LANG)
     # Handle deep-link: /start rules_<gid> | rulesu_<username> | rules64_<b64(gid)>
-    param: str | None = None
-    if context.args:
-        param = context.args[0]
-    else:
-        txt = update.effective_message.text or ""
-        parts = txt.split(maxsplit=1)
-        if len(parts) == 2:
-            param = parts[1]
+    # Only registered via CommandHandler, which always fills context.args from the message text
+    param: str | None = context.args[0] if context.args else None
     gid: int | None = None
     join_action = None  # Track if this is a join request action
     join_gid = None
@@ -150,9 +249,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     
     if param:
         # Check for join request deep links first
-        import base64
-        if len(param) > 0 and not param.startswith("rules"):
-            # Try to decode as base64 join request
+        if param.startswith(_JOIN_B64_PREFIXES):
+            # Decode the base64 join request
             try:
                 pad = '=' * (-len(param) % 4)
                 decoded = base64.urlsafe_b64decode(param + pad).decode()
@@ -164,58 +262,47 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                         join_uid = int(parts[3])
                         # Process join request action
                         if update.effective_user and update.effective_user.id == join_uid:
-                            # Delete the /start message immediately
-                            try:
-                                await update.effective_message.delete()
-                            except Exception:
-                                pass  # Ignore if deletion fails
+                            # Delete the /start message immediately (failures are ignored)
+                            delete_start = update.effective_message.delete()
                             
                             if join_action == "accept":
+                                # Try to edit the original rules message
+                                original_msg_id = pop_join_rules_msg(join_gid, join_uid)
+                                # The delete, the approval and the lookups for the edited message are independent
+                                lookups = (
+                                    (_rules_and_title(join_gid), cached_get_chat(context, join_gid))
+                                    if original_msg_id else ()
+                                )
+                                _, approve_res, *lookup_res = await asyncio.gather(
+                                    delete_start,
+                                    context.bot.approve_chat_join_request(join_gid, join_uid),
+                                    *lookups,
+                                    return_exceptions=True,
+                                )
                                 try:
-                                    await context.bot.approve_chat_join_request(join_gid, join_uid)
-                                    
-                                    # Try to edit the original rules message
-                                    original_msg_id = context.application.user_data.get(join_uid, {}).get(f"join_rules_msg_{join_gid}")
+                                    if isinstance(approve_res, Exception):
+                                        if original_msg_id:
+                                            # Keep the rules DM findable for a retry or a later decline
+                                            remember_join_rules_msg(join_gid, join_uid, original_msg_id)
+                                        raise approve_res
                                     
                                     if original_msg_id:
                                         # Get the original message text to keep it
-                                        from .infra import db
-                                        from .infra.settings_repo import SettingsRepo
-                                        rules_text = None
-                                        group_title = str(join_gid)
-                                        async with db.SessionLocal() as s:  # type: ignore
-                                            rules_text = await SettingsRepo(s).get_text(join_gid, "rules")
-                                            try:
-                                                from .infra.models import Group
-                                                g = await s.get(Group, join_gid)
-                                                if g and g.title:
-                                                    group_title = g.title
-                                            except Exception:
-                                                pass
-                                        try:
-                                            chat = await context.bot.get_chat(join_gid)
+                                        rules_res, chat = lookup_res
+                                        rules_text, db_title = (None, None) if isinstance(rules_res, Exception) else rules_res
+                                        group_title = db_title or str(join_gid)
+                                        # One chat lookup supplies both the live title and the return link
+                                        return_kb = None
+                                        if not isinstance(chat, Exception):
                                             if chat and chat.title:
                                                 group_title = chat.title
-                                        except Exception:
-                                            pass
+                                            if getattr(chat, "username", None):
+                                                return_kb = return_group_kb(lang, f"https://t.me/{chat.username}")
                                         
                                         header = t(lang, "rules.dm.header")
                                         txt = header + "\n\n" + t(lang, "join.dm.rules", group_title=group_title, rules=rules_text or t(lang, "rules.default"))
                                         txt += f"\n\n✅ {t(lang, 'rules.accepted')}"
                                         
-                                        # Add return button if group has username
-                                        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-                                        return_kb = None
-                                        try:
-                                            chat = await context.bot.get_chat(join_gid)
-                                            if getattr(chat, "username", None):
-                                                url = f"https://t.me/{chat.username}"
-                                                return_kb = InlineKeyboardMarkup(
-                                                    [[InlineKeyboardButton(t(lang, "rules.return_group"), url=url)]]
-                                                )
-                                        except Exception:
-                                            return_kb = None
-                                        
                                         # Edit the original message - remove buttons and add acceptance note
                                         try:
                                             await context.bot.edit_message_text(
@@ -226,33 +313,23 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                                                 parse_mode="HTML"
                                             )
                                         except Exception as e:
-                                            log.warning(f"Could not edit original message: {e}")
+                                            log.warning("Could not edit original message: %s", e)
                                             # Fallback: send a brief success message that auto-deletes
                                             success_msg = await context.bot.send_message(
                                                 chat_id=update.effective_chat.id,
                                                 text="✅ " + t(lang, 'rules.accepted'),
                                                 parse_mode="HTML"
                                             )
-                                            async def delete_success(ctx):
-                                                try:
-                                                    await ctx.bot.delete_message(update.effective_chat.id, success_msg.message_id)
-                                                except Exception:
-                                                    pass
-                                            context.job_queue.run_once(delete_success, when=3)
+                                            delete_scheduler.schedule(context.bot, 3, update.effective_chat.id, success_msg.message_id)
                                     else:
                                         # No stored message ID, just send brief confirmation
                                         success_msg = await context.bot.send_message(
                                             chat_id=update.effective_chat.id,
                                             text="✅ " + t(lang, 'rules.accepted')
                                         )
-                                        async def delete_success(ctx):
-                                            try:
-                                                await ctx.bot.delete_message(update.effective_chat.id, success_msg.message_id)
-                                            except Exception:
-                                                pass
-                                        context.job_queue.run_once(delete_success, when=3)
+                                        delete_scheduler.schedule(context.bot, 3, update.effective_chat.id, success_msg.message_id)
                                     
-                                    log.info(f"Approved join request via deep link for user {join_uid} in group {join_gid}")
+                                    log.info("Approved join request via deep link for user %s in group %s", join_uid, join_gid)
                                 except Exception as e:
                                     log.exception("Failed to approve join request via deep link gid=%s uid=%s: %s", join_gid, join_uid, e)
                                     error_msg = await context.bot.send_message(
@@ -260,18 +337,17 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                                         text=t(lang, "join.error")
                                     )
                                     # Delete error message after 5 seconds
-                                    async def delete_error(ctx):
-                                        try:
-                                            await ctx.bot.delete_message(update.effective_chat.id, error_msg.message_id)
-                                        except Exception:
-                                            pass
-                                    context.job_queue.run_once(delete_error, when=5)
+                                    delete_scheduler.schedule(context.bot, 5, update.effective_chat.id, error_msg.message_id)
                             elif join_action == "decline":
+                                try:
+                                    await delete_start
+                                except Exception:
+                                    pass  # Ignore if deletion fails
                                 try:
                                     await context.bot.decline_chat_join_request(join_gid, join_uid)
                                     
                                     # Try to edit the original rules message
-                                    original_msg_id = context.application.user_data.get(join_uid, {}).get(f"join_rules_msg_{join_gid}")
+                                    original_msg_id = pop_join_rules_msg(join_gid, join_uid)
                                     
                                     if original_msg_id:
                                         # Edit the original message to show decline status
@@ -279,7 +355,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                                             # Get group title for the message
                                             group_title = str(join_gid)
                                             try:
-                                                chat = await context.bot.get_chat(join_gid)
+                                                chat = await cached_get_chat(context, join_gid)
                                                 if chat and chat.title:
                                                     group_title = chat.title
                                             except Exception:
@@ -295,33 +371,23 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                                                 reply_markup=None  # Remove all buttons
                                             )
                                         except Exception as e:
-                                            log.warning(f"Could not edit original message for decline: {e}")
+                                            log.warning("Could not edit original message for decline: %s", e)
                                             # Fallback: send decline message that auto-deletes
                                             decline_msg = await context.bot.send_message(
                                                 chat_id=update.effective_chat.id,
                                                 text="❌ " + t(lang, "join.declined_message"),
                                                 parse_mode="HTML"
                                             )
-                                            async def delete_decline(ctx):
-                                                try:
-                                                    await ctx.bot.delete_message(update.effective_chat.id, decline_msg.message_id)
-                                                except Exception:
-                                                    pass
-                                            context.job_queue.run_once(delete_decline, when=3)
+                                            delete_scheduler.schedule(context.bot, 3, update.effective_chat.id, decline_msg.message_id)
                                     else:
                                         # No stored message ID, send brief decline message
                                         decline_msg = await context.bot.send_message(
                                             chat_id=update.effective_chat.id,
                                             text="❌ " + t(lang, "join.declined_message")
                                         )
-                                        async def delete_decline(ctx):
-                                            try:
-                                                await ctx.bot.delete_message(update.effective_chat.id, decline_msg.message_id)
-                                            except Exception:
-                                                pass
-                                        context.job_queue.run_once(delete_decline, when=3)
+                                        delete_scheduler.schedule(context.bot, 3, update.effective_chat.id, decline_msg.message_id)
                                     
-                                    log.info(f"Declined join request via deep link for user {join_uid} in group {join_gid}")
+                                    log.info("Declined join request via deep link for user %s in group %s", join_uid, join_gid)
                                 except Exception as e:
                                     log.exception("Failed to decline join request via deep link gid=%s uid=%s: %s", join_gid, join_uid, e)
                                     error_msg = await context.bot.send_message(
@@ -329,16 +395,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                                         text=t(lang, "join.error")
                                     )
                                     # Delete error message after 5 seconds  
-                                    async def delete_error(ctx):
-                                        try:
-                                            await ctx.bot.delete_message(update.effective_chat.id, error_msg.message_id)
-                                        except Exception:
-                                            pass
-                                    context.job_queue.run_once(delete_error, when=5)
+                                    delete_scheduler.schedule(context.bot, 5, update.effective_chat.id, error_msg.message_id)
                             
                             # Track user interaction
-                            from .infra import db
-                            from .infra.repos import UsersRepo
                             try:
                                 async with db.SessionLocal() as s:  # type: ignore
                                     await UsersRepo(s).upsert_user(
@@ -356,37 +415,15 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                 pass  # Not a join request deep link, continue with normal processing
         
         # Normal rules deep links
-        if param.startswith("rulesu_"):
-            uname = param[7:]
-            try:
-                chat = await context.bot.get_chat(f"@{uname}")
-                gid = chat.id
-            except Exception as e:
-                log.exception("get_chat by username failed for %s: %s", uname, e)
-                gid = None
-        elif param.startswith("rules64_"):
-            import base64
-            data = param[8:]
-            # Add padding back for urlsafe b64
-            pad = '=' * (-len(data) % 4)
-            try:
-                decoded = base64.urlsafe_b64decode(data + pad).decode()
-                gid = int(decoded)
-            except Exception as e:
-                log.exception("Failed to decode rules64 payload '%s': %s", data, e)
-                gid = None
-        elif param.startswith("rules_"):
-            gid_s = param[7:]
-            try:
-                gid = int(gid_s)
-            except ValueError:
-                gid = None
+        for prefix, parse in _RULES_PARAM_PARSERS:
+            if param.startswith(prefix):
+                gid = await parse(context, param[len(prefix):])
+                break
 
     if gid is not None:
             # Check if we already sent rules in the last few messages
             # This prevents duplicate messages when user clicks "Read & Accept Rules" button
-            recent_messages_key = f"rules_sent_{gid}_{update.effective_user.id if update.effective_user else 0}"
-            if context.user_data.get(recent_messages_key):
+            if rules_recently_sent(gid, update.effective_user.id if update.effective_user else 0):
                 # Rules were already sent, don't duplicate - just remind them to click Accept above
                 lang = I18N.pick_lang(update)
                 reminder_msg = await update.effective_message.reply_text(t(lang, "rules.already_sent"))
@@ -394,44 +431,28 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                 context.user_data[f"reminder_msg_{gid}_{update.effective_user.id}"] = reminder_msg.message_id
                 return
             
-            from .infra import db
-            from .infra.settings_repo import SettingsRepo
-            rules_text = None
-            group_title = str(gid)
-            async with db.SessionLocal() as s:  # type: ignore
-                rules_text = await SettingsRepo(s).get_text(gid, "rules")
-                # DB fallback title (in case get_chat fails)
-                try:
-                    from .infra.models import Group
-                    g = await s.get(Group, gid)
-                    if g and g.title:
-                        group_title = g.title
-                except Exception as e:
-                    log.exception("Failed to read group title from DB gid=%s: %s", gid, e)
-            # Try live chat info for accurate title
+            # Rules text and DB fallback title (in case get_chat fails) in one round-trip
+            rules_text, db_title = await _rules_and_title(gid)
+            group_title = db_title or str(gid)
+            # Live chat info for an accurate title and, for public groups, the username
+            chat = None
             try:
-                chat = await context.bot.get_chat(gid)
+                chat = await cached_get_chat(context, gid)
                 if chat and chat.title:
                     group_title = chat.title
             except Exception as e:
-                log.exception("get_chat failed for gid=%s: %s", gid, e)
+                log.info("get_chat failed for gid=%s: %s", gid, e, exc_info=log.isEnabledFor(logging.DEBUG))
             # Create professional rules message with group link and user mention
-            from telegram import InlineKeyboardButton, InlineKeyboardMarkup
             
             uid = update.effective_user.id if update.effective_user else 0
-            user_name = update.effective_user.first_name if update.effective_user else "Member"
-            user_mention = f'<a href="tg://user?id={uid}">{user_name}</a>'
+            user_mention = user_mention_html(update.effective_user)
             
             # Create group link - only for public groups with username
             group_link = f"<b>{group_title}</b>"  # Default: bold group name for private groups
-            try:
-                chat = await context.bot.get_chat(gid)
-                if chat and chat.username:
-                    # Public group - create clickable link
-                    group_link = f'<a href="https://t.me/{chat.username}">{group_title}</a>'
-                # For private groups, just use bold text (no invite link in rules message)
-            except Exception:
-                pass  # Fallback to bold group name
+            if chat and chat.username:
+                # Public group - create clickable link
+                group_link = f'<a href="https://t.me/{chat.username}">{group_title}</a>'
+            # For private groups, just use bold text (no invite link in rules message)
             
             # Use localized professional template
             if not rules_text:
@@ -461,29 +482,28 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             kb = InlineKeyboardMarkup([[InlineKeyboardButton("✅ Accept Rules", callback_data=f"rules:accept:{gid}:{uid}")]])
             await update.effective_message.reply_text(txt, reply_markup=kb, parse_mode="HTML")
             
-            # Mark that we sent rules to avoid duplication
-            context.user_data[recent_messages_key] = True
-            # Clear flag after some time
-            async def clear_flag(ctx: ContextTypes.DEFAULT_TYPE):
-                if ctx.user_data is not None:
-                    ctx.user_data.pop(recent_messages_key, None)
-            context.job_queue.run_once(clear_flag, when=300)  # Clear after 5 minutes
+            # Mark that we sent rules to avoid duplication for the next few minutes
+            mark_rules_sent(gid, uid)
             
             return
     
     # Check if we're in private chat
     if update.effective_chat and update.effective_chat.type == "private":
+        # A bare /start repeated within the cooldown would resend the identical welcome. The first
+        # repeat is still answered, since the user may not have seen the previous reply
+        now = time.monotonic()
+        if not param and now - context.user_data.get("_last_start_ts", float("-inf")) < PRIVATE_START_COOLDOWN:
+            if context.user_data.get("_start_repeated"):
+                return
+            context.user_data["_start_repeated"] = True
+        else:
+            context.user_data["_start_repeated"] = False
         # Show the professional welcome message for private users
         bot_name = t(lang, "bot.name")
         text = t(lang, "start.private.welcome", bot_name=bot_name)
         
         # Add buttons for channel and panel
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-        keyboard = [
-            [InlineKeyboardButton(t(lang, "bot.button.updates"), url="https://t.me/tahikal")],
-            [InlineKeyboardButton(t(lang, "bot.button.manage"), callback_data="panel:back")]
-        ]
-        markup = InlineKeyboardMarkup(keyboard)
+        markup = _private_kb(lang)
         
         await update.effective_message.reply_text(
             text, 
@@ -491,6 +511,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             reply_markup=markup,
             disable_web_page_preview=True
         )
+        # Only a delivered welcome starts the cooldown; a failed send leaves the next /start answered
+        context.user_data["_last_start_ts"] = now
     else:
         # In group, show simple welcome
         text = t(lang, "start.welcome", first_name=update.effective_user.first_name or "")
@@ -505,12 +527,7 @@ async def help_(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
         text = t(lang, "help.private")
         
         # Add buttons
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-        keyboard = [
-            [InlineKeyboardButton(t(lang, "bot.button.updates"), url="https://t.me/tahikal")],
-            [InlineKeyboardButton(t(lang, "bot.button.manage"), callback_data="panel:back")]
-        ]
-        markup = InlineKeyboardMarkup(keyboard)
+        markup = _private_kb(lang)
         
         await update.effective_message.reply_text(
             text,
@@ -522,62 +539,40 @@ async def help_(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
         await update.effective_message.reply_text(t(lang, "help.text"))
 
 
-async def main() -> None:
+def _install_uvloop() -> None:
+    """Use uvloop's event loop policy when it is installed; stdlib asyncio otherwise."""
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    log.info("Using uvloop event loop")
+
+
+def main() -> None:
     # Ensure data directory exists for SQLite path
-    from pathlib import Path
     Path("data").mkdir(exist_ok=True)
     
     # Set up logging (debug mode from env)
-    import os
     debug_mode = os.getenv("DEBUG", "").lower() in ("1", "true", "yes")
     setup_logging(log_file=True, debug=debug_mode)
-    
-    # Log startup info
-    log.info(f"Bot starting with {len(settings.OWNER_IDS)} owner(s) configured")
-
-    await init_engine(settings.DATABASE_URL)
-    init_sessionmaker()
-    app = make_app()
-
-    await app.run_polling(
-        allowed_updates=[
-            "message",
-            "callback_query",
-            "chat_member",
-            "my_chat_member",
-            "chat_join_request",
-        ],
-        drop_pending_updates=True,
-    )
+    log.info("Bot starting with %d owner(s) configured", len(settings.OWNER_IDS))
 
+    # Must run before the loop below is created for the policy to take effect
+    _install_uvloop()
 
-if __name__ == "__main__":
-    # Ensure data directory exists for SQLite path
-    from pathlib import Path
-    Path("data").mkdir(exist_ok=True)
-    
-    # Set up logging first (debug mode from env)
-    import os
-    debug_mode = os.getenv("DEBUG", "").lower() in ("1", "true", "yes")
-    setup_logging(log_file=True, debug=debug_mode)
-    
-    # Initialize database synchronously
+    # run_polling() drives this loop itself; on_startup (post_init) runs migrations before polling
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     loop.run_until_complete(init_engine(settings.DATABASE_URL))
     init_sessionmaker()
-    # Run migrations to create the SQLite file and tables early
-    loop.run_until_complete(migrate())
-    
-    # Create and run the app
+
     app = make_app()
     app.run_polling(
-        allowed_updates=[
-            "message",
-            "callback_query",
-            "chat_member",
-            "my_chat_member",
-            "chat_join_request",
-        ],
+        allowed_updates=list(_ALLOWED_UPDATES),
         drop_pending_updates=True,
     )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ from __future__ import annotations
 
 import asyncio
 
+from sqlalchemy.dialects.sqlite import insert
+
 from bot.core.config import settings
 from bot.infra import db
 from bot.infra.migrate import migrate
@@ -17,10 +19,14 @@ async def main() -> None:
     await db.init_engine(settings.DATABASE_URL)
     db.init_sessionmaker()
     await migrate()
+    if not settings.OWNER_IDS:
+        return
+    # One INSERT for all owners; rows that already exist are left untouched
+    stmt = insert(User).values(
+        [{"id": uid, "language": "en"} for uid in settings.OWNER_IDS]
+    ).on_conflict_do_nothing(index_elements=[User.id])
     async with db.SessionLocal() as s:  # type: ignore
-        for uid in settings.OWNER_IDS:
-            if await s.get(User, uid) is None:
-                s.add(User(id=uid, username=None, first_name=None, last_name=None, language="en"))
+        await s.execute(stmt)
         await s.commit()
 
 
@@ -0,0 +1,111 @@
+"""Join CAPTCHA combined with the onboarding rules-accept mute."""
+
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("sqlalchemy")
+
+from telegram import ChatPermissions  # noqa: E402
+from telegram.constants import ChatMemberStatus  # noqa: E402
+
+from bot.features.verification import handlers as verification  # noqa: E402
+from bot.features.welcome import handlers as welcome  # noqa: E402
+
+GID = -100123
+UID = 42
+
+
+class FakeBot:
+    def __init__(self) -> None:
+        self.restricts: list[ChatPermissions] = []
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+        return SimpleNamespace(message_id=self.sent)
+
+    async def restrict_chat_member(self, chat_id, user_id, permissions):
+        self.restricts.append(permissions)
+
+    async def delete_message(self, chat_id, message_id):
+        return True
+
+    async def get_me(self):
+        return SimpleNamespace(username="testbot")
+
+    async def get_chat(self, chat_id):
+        return SimpleNamespace(permissions=ChatPermissions(can_send_messages=True))
+
+
+async def _noop(*args, **kwargs):
+    return None
+
+
+USER = SimpleNamespace(id=UID, is_bot=False, first_name="Ann", username=None, language_code="en")
+CHAT = SimpleNamespace(id=GID, type="supergroup", title="Group", username=None)
+
+
+def _context(monkeypatch, cfgs: dict) -> SimpleNamespace:
+    async def get_cached(group_id, keys):
+        return cfgs
+
+    monkeypatch.setattr(welcome.settings_repo, "get_cached", get_cached)
+    return SimpleNamespace(bot=FakeBot(), bot_data={}, application=SimpleNamespace(create_task=asyncio.ensure_future))
+
+
+async def _join(context, via_join_request: bool = False) -> None:
+    joined = SimpleNamespace(
+        new_chat_member=SimpleNamespace(status=ChatMemberStatus.MEMBER, user=USER),
+        old_chat_member=SimpleNamespace(status=ChatMemberStatus.LEFT, user=USER),
+        via_join_request=via_join_request,
+    )
+    await welcome.on_chat_member(SimpleNamespace(chat_member=joined, effective_chat=CHAT, effective_user=USER), context)
+
+
+def _join_and_solve(monkeypatch, cfgs: dict) -> FakeBot:
+    context = _context(monkeypatch, cfgs)
+
+    async def run() -> None:
+        await _join(context)
+        pending = context.bot_data["verify"][GID][UID]
+        query = SimpleNamespace(data=f"captcha:math:{GID}:{UID}:{pending.answer}", answer=_noop, message=None)
+        await verification.on_captcha_callback(
+            SimpleNamespace(callback_query=query, effective_user=USER, effective_chat=CHAT), context
+        )
+        assert GID not in context.bot_data["verify"]
+
+    asyncio.run(run())
+    return context.bot
+
+
+CAPTCHA = {"enabled": True, "mode": "math", "timeout": 120}
+
+
+def test_captcha_pass_keeps_rules_accept_mute(monkeypatch):
+    bot = _join_and_solve(monkeypatch, {"captcha": CAPTCHA, "onboarding": {"require_accept_unmute": True}})
+    # Only the welcome mute; solving the CAPTCHA must not lift it
+    assert [p.can_send_messages for p in bot.restricts] == [False]
+
+
+def test_captcha_pass_unrestricts_without_explicit_opt_in(monkeypatch):
+    # The rules-accept mute is on by default, but only an explicit setting keeps it past the CAPTCHA
+    bot = _join_and_solve(monkeypatch, {"captcha": CAPTCHA})
+    assert [p.can_send_messages for p in bot.restricts] == [False, True]
+
+
+def test_captcha_pass_unrestricts_without_rules_gate(monkeypatch):
+    bot = _join_and_solve(monkeypatch, {"captcha": CAPTCHA, "onboarding": {"require_accept_unmute": False}})
+    assert [p.can_send_messages for p in bot.restricts] == [True]
+
+
+def test_join_request_approval_left_to_onboarding(monkeypatch):
+    context = _context(monkeypatch, {"captcha": CAPTCHA, "onboarding": {"require_accept_unmute": True}})
+    asyncio.run(_join(context, via_join_request=True))
+    assert context.bot.sent == 0
+    assert context.bot.restricts == []
+    assert "verify" not in context.bot_data